@@ -1,11 +1,14 @@
 """
 SSW555 GEDCOM Parsing Project - Team02
 This is the main file for the project
+
+Run with --metrics to print the time and memory of each story, and save them in the log, see run.
 """
 import json
 import logging
 import sys
 
+from gedcom import metrics
 from gedcom.parser import File
 import stories
 
@@ -13,12 +16,24 @@ __author__ = "Adam Burbidge, Constantine Davantzis, Vibha Ravi"
 __status__ = "Development"
 
 
-def run(gedcom_file, show_passed=False):
+def run(gedcom_file, show_passed=False, processes=None, show_metrics=False, save_metrics=False):
     """ Check Gedcom File For Errors
 
     :param gedcom_file: The GEDCOM File object to perform assignment on
     :type gedcom_file: parser.File
 
+    :param processes: Run the stories in this many worker processes (see stories.run_stories_parallel), or all in
+    this process if None
+    :type processes: int
+
+    :param show_metrics: Print a table of the time and memory of each story, and the calls and time of the parser
+    primitives, to the console.
+    :type show_metrics: bool
+
+    :param save_metrics: Save the same metrics in the "metrics" section of the log. Metrics are only collected if
+    show_metrics or save_metrics is True, as timing the parser primitives slows the run down.
+    :type save_metrics: bool
+
     """
 
     # Log only failed cases to console if show_passed is False else show passed and failed cases
@@ -36,36 +51,57 @@ def run(gedcom_file, show_passed=False):
     debug_output.setLevel(logging.DEBUG)
     stories.logger.addHandler(debug_output)
 
-    log = {
-        "individuals": stories.individual_summary(gedcom_file),
-        "families": stories.family_summary(gedcom_file),
-        "stories": [
-            stories.dates_before_current_date(gedcom_file),
-            stories.birth_before_marriage(gedcom_file),
-            stories.birth_before_death(gedcom_file),
-            stories.marriage_before_divorce(gedcom_file),
-            stories.marriage_before_death(gedcom_file),
-            stories.divorce_before_death(gedcom_file),
-            stories.less_then_150_years_old(gedcom_file),
-            stories.birth_before_marriage_of_parents(gedcom_file),
-            stories.birth_before_death_of_parents(gedcom_file),
-            stories.marriage_after_14(gedcom_file),
-            stories.no_bigamy(gedcom_file),
-            stories.parents_not_too_old(gedcom_file),
-            stories.siblings_spacing(gedcom_file),
-            stories.less_than_5_multiple_births(gedcom_file),
-            stories.fewer_than_15_siblings(gedcom_file),
-            stories.male_last_names(gedcom_file),
-            stories.no_marriages_to_descendants(gedcom_file),
-            stories.siblings_should_not_marry(gedcom_file),
-            stories.first_cousins_should_not_marry(gedcom_file),
-            stories.aunts_and_uncles(gedcom_file),
-            stories.correct_gender_for_role(gedcom_file),
-            stories.unique_ids(gedcom_file),
-            stories.unique_name_and_birth_date(gedcom_file),
-            stories.unique_families_by_spouses(gedcom_file)
-        ]
-    }
+    run_stories = lambda f, story_functions: [story_function(f) for story_function in story_functions]
+    if processes is not None:
+        run_stories = lambda f, story_functions: stories.run_stories_parallel(f, story_functions, processes)
+
+    collect_metrics = show_metrics or save_metrics
+    if collect_metrics:
+        metrics.reset()
+        metrics.enable()
+
+    try:
+        log = {
+            "individuals": stories.individual_summary(gedcom_file),
+            "families": stories.family_summary(gedcom_file),
+            "stories": run_stories(gedcom_file, [
+                stories.dates_before_current_date,
+                stories.birth_before_marriage,
+                stories.birth_before_death,
+                stories.marriage_before_divorce,
+                stories.marriage_before_death,
+                stories.divorce_before_death,
+                stories.less_then_150_years_old,
+                stories.birth_before_marriage_of_parents,
+                stories.birth_before_death_of_parents,
+                stories.marriage_after_14,
+                stories.no_bigamy,
+                stories.parents_not_too_old,
+                stories.siblings_spacing,
+                stories.less_than_5_multiple_births,
+                stories.fewer_than_15_siblings,
+                stories.male_last_names,
+                stories.no_marriages_to_descendants,
+                stories.siblings_should_not_marry,
+                stories.first_cousins_should_not_marry,
+                stories.aunts_and_uncles,
+                stories.correct_gender_for_role,
+                stories.unique_ids,
+                stories.unique_name_and_birth_date,
+                stories.unique_families_by_spouses,
+                stories.include_partial_dates,
+                stories.reject_illegitimate_dates
+            ])
+        }
+    finally:
+        metrics.disable()
+
+    if collect_metrics:
+        report = metrics.report()
+        if save_metrics:
+            log["metrics"] = report
+        if show_metrics:
+            print "\n".join(metrics.summary_table(report))
 
     # attempt to save log to json file
     try:
@@ -77,6 +113,8 @@ def run(gedcom_file, show_passed=False):
 
 
 if __name__ == "__main__":
+    # Metrics are only collected when asked for on the command line
+    with_metrics = "--metrics" in sys.argv[1:]
     gedcom_file = File()
     # Request file name from user
     fname = raw_input('Enter the file name to open: ')
@@ -87,7 +125,7 @@ if __name__ == "__main__":
     except IOError as e:
         sys.exit("Error Opening File - {0}: '{1}'".format(e.strerror, e.filename))
 
-    run(gedcom_file, show_passed=False)
+    run(gedcom_file, show_passed=False, show_metrics=with_metrics, save_metrics=with_metrics)
 
     print "Successfully saved output to {0}".format('Test_Results/output.md')
     print "Successfully saved debug output to {0}".format('Test_Results/output.debug.md')
@@ -0,0 +1,283 @@
+"""
+Benchmarks for the GEDCOM parser
+
+Run with: python benchmarks.py
+"""
+import glob
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+
+from gedcom import ages
+from gedcom import parser
+from gedcom import tools
+from gedcom.kinship import Ancestry
+from gedcom.parser import File
+
+__author__ = "Constantine Davantzis"
+
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+
+def synthetic_gedcom(families, seed=555):
+    """ Generate the text of a synthetic GEDCOM file
+
+    Each family has a husband, a wife and three children, and every individual has a name, sex, birth date and
+    family pointers. This gives roughly 45 lines per family.
+
+    :param families: The number of families to generate
+    :type families: int
+
+    :param seed: Seed for the random dates
+    :type seed: int
+
+    :return: GEDCOM file plain text
+    :rtype: str
+
+    """
+    rand = random.Random(seed)
+    date = lambda: "{0} {1} {2}".format(rand.randint(1, 28), rand.choice(MONTHS), rand.randint(1800, 2000))
+    out = ["0 HEAD", "0 NOTE synthetic benchmark file"]
+    for f in range(families):
+        members = [("H", "M", "FAMS"), ("W", "F", "FAMS"), ("C1", "M", "FAMC"), ("C2", "F", "FAMC"), ("C3", "M", "FAMC")]
+        for role, sex, fam_tag in members:
+            out += ["0 @I{0}{1}@ INDI".format(f, role),
+                    "1 NAME Person{0}{1} /Family{0}/".format(f, role),
+                    "1 SEX {0}".format(sex),
+                    "1 BIRT",
+                    "2 DATE {0}".format(date()),
+                    "1 {0} @F{1}@".format(fam_tag, f)]
+        out += ["0 @F{0}@ FAM".format(f),
+                "1 HUSB @I{0}H@".format(f),
+                "1 WIFE @I{0}W@".format(f),
+                "1 CHIL @I{0}C1@".format(f),
+                "1 CHIL @I{0}C2@".format(f),
+                "1 CHIL @I{0}C3@".format(f),
+                "1 MARR",
+                "2 DATE {0}".format(date())]
+    out.append("0 TRLR")
+    return "\n".join(out) + "\n"
+
+
+def write_synthetic_gedcom(families):
+    """ Write a synthetic GEDCOM file to a temporary file
+
+    :param families: The number of families to generate
+    :type families: int
+
+    :return: path of the temporary file, the caller is responsible for removing it
+    :rtype: str
+
+    """
+    fd, path = tempfile.mkstemp(suffix=".ged")
+    with os.fdopen(fd, "w") as filehandle:
+        filehandle.write(synthetic_gedcom(families))
+    return path
+
+
+def load(path):
+    """ Read a GEDCOM file into a File object """
+    gedcom_file = File()
+    gedcom_file.read_file(path)
+    return gedcom_file
+
+
+def bench_load(sizes=(1000, 2000, 4000, 8000), repeat=3):
+    """ Time File.read_file on synthetic files of increasing size
+
+    Load time per line should stay roughly constant as the file grows, which shows that loading scales linearly.
+
+    """
+    print "### File.read_file ###"
+    print "{0:>10} {1:>10} {2:>12}".format("lines", "seconds", "usec/line")
+    for size in sizes:
+        path = write_synthetic_gedcom(size)
+        try:
+            lines = len(load(path).lines)
+            seconds = min(timeit.repeat(lambda: load(path), number=1, repeat=repeat))
+        finally:
+            os.remove(path)
+        print "{0:>10} {1:>10.3f} {2:>12.2f}".format(lines, seconds, seconds / lines * 1e6)
+    print
+
+
+def bench_parallel_load(families=8000, processes=(1, 2, 4, 8, 16), repeat=3):
+    """ Compare File.read_file with File.read_file_parallel using an increasing number of processes
+
+    :note: Speedup is limited by the number of CPUs of the machine, and by the lines having to be sent back to, and
+    wrapped in Line objects by, the main process.
+
+    """
+    print "### File.read_file_parallel ({0} CPUs) ###".format(multiprocessing.cpu_count())
+    print "{0:>10} {1:>10}".format("processes", "seconds")
+    path = write_synthetic_gedcom(families)
+    try:
+        seconds = min(timeit.repeat(lambda: load(path), number=1, repeat=repeat))
+        print "{0:>10} {1:>10.3f}".format("serial", seconds)
+        for count in processes:
+            seconds = min(timeit.repeat(lambda: File().read_file_parallel(path, count), number=1, repeat=repeat))
+            print "{0:>10} {1:>10.3f}".format(count, seconds)
+    finally:
+        os.remove(path)
+    print
+
+
+def bench_parse_line(scale=100, repeat=3):
+    """ Compare parse_line with parse_line_regex on the lines of the Test_Files corpus repeated scale times """
+    print "### parse_line vs parse_line_regex ###"
+    corpus = []
+    for filename in glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test_Files", "*.ged")):
+        with open(filename) as filehandle:
+            corpus.extend(line.strip() for line in filehandle if line.strip())
+    corpus *= scale
+    print "{0:>18} {1:>10} {2:>12}".format("function", "seconds", "usec/line")
+    for function in (parser.parse_line_regex, parser.parse_line):
+        seconds = min(timeit.repeat(lambda: map(function, corpus), number=1, repeat=repeat))
+        print "{0:>18} {1:>10.3f} {2:>12.2f}".format(function.__name__, seconds, seconds / len(corpus) * 1e6)
+    print
+
+
+def bench_parse_date(scale=100, repeat=3):
+    """ Compare parse_date with parse_date_strptime on the DATE values of the Test_Files corpus repeated scale times
+
+    :note: The cache of parse_date is cleared before each run, so the first read of every date is included.
+
+    """
+    print "### parse_date vs parse_date_strptime ###"
+    dates = []
+    for filename in glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test_Files", "*.ged")):
+        with open(filename) as filehandle:
+            dates.extend(line.split("DATE", 1)[1].strip() for line in filehandle if line.startswith("2 DATE "))
+    dates *= scale
+    print "{0:>20} {1:>10} {2:>12}".format("function", "seconds", "usec/date")
+
+    def cached(values):
+        tools._date_cache.clear()
+        map(tools.parse_date, values)
+
+    for name, function in (("parse_date_strptime", lambda values: map(tools.parse_date_strptime, values)),
+                           ("split_date", lambda values: map(tools.split_date, values)),
+                           ("parse_date", cached)):
+        seconds = min(timeit.repeat(lambda: function(dates), number=1, repeat=repeat))
+        print "{0:>20} {1:>10.3f} {2:>12.2f}".format(name, seconds, seconds / len(dates) * 1e6)
+    print
+
+
+def bench_ages(families=4000, pairs=1000000, repeat=3):
+    """ Time building an AgeTable, and compare ages.years_between with tools.years_between one pair at a time
+
+    :note: Without NumPy ages.years_between is a Python loop, so the comparison shows what NumPy adds.
+
+    """
+    print "### Ages ({0}) ###".format("NumPy" if ages.numpy is not None else "no NumPy")
+    gedcom_file = File()
+    gedcom_file.read_lines(synthetic_gedcom(families).splitlines())
+    ages.AgeTable(gedcom_file)  # read the dates once, as the stories would have
+    seconds = min(timeit.repeat(lambda: ages.AgeTable(gedcom_file), number=1, repeat=repeat))
+    print "{0:>28} {1:>10.3f}".format("AgeTable of {0} families".format(families), seconds)
+    rand = random.Random(1)
+    a = [rand.randint(650000, 730000) for _ in xrange(pairs)]
+    b = [rand.randint(650000, 730000) for _ in xrange(pairs)]
+    dates_a, dates_b = map(datetime.fromordinal, a), map(datetime.fromordinal, b)
+    columns_a, columns_b = ages.column(a), ages.column(b)
+    for name, function in (("tools.years_between", lambda: map(tools.years_between, dates_a, dates_b)),
+                           ("ages.years_between", lambda: ages.years_between(columns_a, columns_b))):
+        seconds = min(timeit.repeat(function, number=1, repeat=repeat))
+        print "{0:>28} {1:>10.3f} ({2} pairs)".format(name, seconds, pairs)
+    print
+
+
+def synthetic_pedigree(individuals, generation_size=25000, seed=555):
+    """ Generate the children lists of a synthetic pedigree made of generations of the same size
+
+    Each individual of a generation is the child of a random couple of the previous generation, so the tree is deep
+    and ancestors are shared between many individuals.
+
+    """
+    rand = random.Random(seed)
+    children = [[] for _ in xrange(individuals)]
+    for child in xrange(generation_size, individuals):
+        first = (child // generation_size - 1) * generation_size
+        for parent in rand.sample(xrange(first, first + generation_size), 2):
+            children[parent].append(child)
+    return children
+
+
+def bench_ancestry(individuals=1000000, queries=10000):
+    """ Time building the Ancestry engine and answering is_ancestor queries on a large synthetic pedigree """
+    print "### Ancestry ({0} individuals) ###".format(individuals)
+    children = synthetic_pedigree(individuals)
+    start = timeit.default_timer()
+    ancestry = Ancestry(children)
+    print "{0:>28} {1:>10.3f}".format("build seconds", timeit.default_timer() - start)
+    rand = random.Random(1)
+    # Pairs from the same generation, like the spouses checked by no_marriages_to_descendants.
+    same = [(a, a - a % 25000 + rand.randrange(25000)) for a in (rand.randrange(individuals) for _ in xrange(queries))]
+    # Pairs of an individual and a descendant one to three generations down.
+    near = []
+    for a in rand.sample(xrange(individuals), queries):
+        b = a
+        for _ in xrange(rand.randint(1, 3)):
+            b = rand.choice(children[b] or [b])
+        if b != a:
+            near.append((a, b))
+    for name, pairs in (("same generation", same), ("descendants", near)):
+        start = timeit.default_timer()
+        found = sum(ancestry.is_ancestor(a, b) for a, b in pairs)
+        seconds = timeit.default_timer() - start
+        print "{0:>28} {1:>10.2f} usec/query ({2} ancestors)".format(name, seconds / len(pairs) * 1e6, found)
+    print
+
+
+def peak_memory(backend, path):
+    """ Peak memory in kilobytes of a new python process that reads a GEDCOM file with a backend
+
+    :note: A new process is used for each measurement so that the peak of one backend doesn't hide the other.
+    The peak of a process that only imports the gedcom package is subtracted. Only supported on unix.
+
+    :param backend: "File", "CompactFile" or "MappedFile", or None to only import.
+    :type backend: str
+
+    :note: The pages of a MappedFile that have been read count towards its peak memory, even though they belong to
+    the operating system's file cache.
+
+    """
+    code = ["import resource", "import gedcom", "from gedcom.compact import CompactFile, MappedFile"]
+    if backend == "File":
+        code.append("f = gedcom.File(); f.read_file({0!r})".format(path))
+    elif backend is not None:
+        code.append("f = {0}(); f.read_file({1!r})".format(backend, path))
+    code.append("print resource.getrusage(resource.RUSAGE_SELF).ru_maxrss")
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    return int(subprocess.check_output([sys.executable, "-c", "\n".join(code)], cwd=cwd))
+
+
+def bench_memory(families=20000):
+    """ Compare the memory used by File, CompactFile and MappedFile on a large synthetic file """
+    print "### Memory: File vs CompactFile vs MappedFile ###"
+    path = write_synthetic_gedcom(families)
+    try:
+        base = peak_memory(None, path)
+        lines = len(synthetic_gedcom(families).splitlines())
+        print "{0:>12} {1:>10} {2:>12}".format("backend", "MB", "bytes/line")
+        for backend in ("File", "CompactFile", "MappedFile"):
+            kb = peak_memory(backend, path) - base
+            print "{0:>12} {1:>10.1f} {2:>12.0f}".format(backend, kb / 1024.0, kb * 1024.0 / lines)
+    finally:
+        os.remove(path)
+    print
+
+
+if __name__ == "__main__":
+    bench_parse_line()
+    bench_parse_date()
+    bench_load()
+    bench_parallel_load()
+    bench_memory()
+    bench_ages()
+    bench_ancestry()
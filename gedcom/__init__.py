@@ -1,4 +1,10 @@
-from parser import File
+from parser import File, iter_records
+import ages
+import compact
+import events
+import kinship
+import metrics
+import names
 import parser
 import tag
 import tools
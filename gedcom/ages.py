@@ -0,0 +1,255 @@
+""" GEDCOM Age Table.
+
+This module computes the ages and age gaps used by the stories for every individual and family of a GEDCOM file at
+once, instead of one pair of datetimes at a time.
+
+The birth, death, marriage and divorce dates are read once into columns of day ordinals (see datetime.toordinal),
+and each age is tools.years_between of two columns. With NumPy installed the columns are NumPy arrays and each age is
+a single vectorized operation, without it the same values are computed in Python.
+
+"""
+
+# Standard Library Imports
+import heapq
+from datetime import datetime
+
+# Third Party Imports
+try:
+    import numpy
+except ImportError:  # NumPy is optional
+    numpy = None
+
+# Local Imports
+import tag
+
+__author__ = "Constantine Davantzis"
+
+NONE = -1
+"""Integer: Index used for a missing husband or wife."""
+
+MISSING = 0
+"""Integer: Day ordinal used for a missing date, real dates start at 1."""
+
+LATEST = datetime.max.toordinal()
+"""Integer: Day ordinal used for the end of a marriage that hasn't ended (datetime.max in Family.marriage_end)."""
+
+
+def now_ordinal(now):
+    """ Returns the day ordinal d such that abs(d - date.toordinal()) is abs((date - now).days) for any date
+
+    :note: timedelta.days rounds down, so a time after midnight counts as the next day.
+
+    """
+    return now.toordinal() + (1 if now != datetime(now.year, now.month, now.day) else 0)
+
+
+def column(values):
+    """ Returns a list of integers as a NumPy array, or the list itself if NumPy isn't installed """
+    return numpy.array(values, dtype=numpy.int64) if numpy is not None else values
+
+
+def years_between(a, b):
+    """ Returns tools.years_between of each pair of day ordinals in two columns, or None for a pair with a missing date
+
+    :param a: Day ordinals, MISSING for a missing date
+    :type a: numpy.ndarray or list of int
+
+    :param b: Day ordinals, MISSING for a missing date
+    :type b: numpy.ndarray or list of int
+
+    :rtype: list of float
+
+    """
+    if numpy is not None:
+        a, b = numpy.asarray(a, dtype=numpy.int64), numpy.asarray(b, dtype=numpy.int64)
+        # The number of days is an integer, so there are no ties for round to break differently than tools.
+        years = numpy.round(numpy.abs(a - b) / 365.0, 2).tolist()
+        known = ((a != MISSING) & (b != MISSING)).tolist()
+        return [y if k else None for y, k in zip(years, known)]
+    return [abs(round(float(x - y) / 365, 2)) if x != MISSING and y != MISSING else None for x, y in zip(a, b)]
+
+
+def fill(values, default):
+    """ Returns the values with each MISSING replaced by default, which is a value or a column of values """
+    if numpy is not None:
+        values = numpy.asarray(values, dtype=numpy.int64)
+        return numpy.where(values != MISSING, values, default)
+    defaults = default if isinstance(default, list) else [default] * len(values)
+    return [v if v != MISSING else d for v, d in zip(values, defaults)]
+
+
+def minimum(a, b):
+    """ Returns the smaller value of each pair of values in two columns """
+    if numpy is not None:
+        return numpy.minimum(a, b)
+    return map(min, a, b)
+
+
+def take(values, indexes, default=MISSING):
+    """ Returns values[i] of each index i, or default where i is NONE """
+    if numpy is not None:
+        values = numpy.append(numpy.asarray(values, dtype=numpy.int64), default)
+        return values[numpy.asarray(indexes, dtype=numpy.int64)]  # NONE (-1) takes the appended default
+    return [values[i] if i != NONE else default for i in indexes]
+
+
+def ordinal(date):
+    """ Returns the day ordinal of a tag.Date, or MISSING if there is no date or it isn't legitimate (see US42) """
+    return date.dt.toordinal() if date is not None and date.legitimate else MISSING
+
+
+def individual_index(indi):
+    """ Returns the kinship_index of a tag.Individual, or NONE if it isn't an individual of the file """
+    i = indi.kinship_index if indi is not None and indi.line is not None else None
+    return i if i is not None else NONE
+
+
+class AgeTable(object):
+    """GEDCOM Age Table Class
+
+    Individuals are referred to by their index in File.individuals (the same as their kinship_index), and families
+    by their index in File.families. Every age is a float of years rounded to two places as returned by
+    tools.years_between, or None if a date it needs is missing.
+
+    :Example:
+        ages = gedcom_file.ages
+        for i, indi in enumerate(gedcom_file.individuals):
+            print indi, ages.age[i]
+
+    """
+
+    def __init__(self, gedcom_file, now=tag.NOW):
+        """Build the Age Table of a File
+
+        :param gedcom_file: The GEDCOM File to build the table of
+        :type gedcom_file: parser.File
+
+        :param now: The current date, used for the age of living individuals
+        :type now: datetime
+
+        """
+        individuals = gedcom_file.individuals
+        families = gedcom_file.families
+
+        self.birth = column([ordinal(indi.birth_date) for indi in individuals])
+        self.death = column([ordinal(indi.death_date) for indi in individuals])
+        self.marriage = column([ordinal(fam.marriage_date) for fam in families])
+        self.divorce = column([ordinal(fam.divorce_date) for fam in families])
+        self.husband = column([individual_index(fam.husband) for fam in families])
+        self.wife = column([individual_index(fam.wife) for fam in families])
+
+        # The children of each family, one (family, child) pair at a time, in the order of Family.children.
+        self.family_pairs = []
+        """The (start, stop) of the pairs of each family."""
+        pair_families, pair_children = [], []
+        for f, fam in enumerate(families):
+            start = len(pair_children)
+            for child in fam.children:
+                pair_families.append(f)
+                pair_children.append(individual_index(child))
+            self.family_pairs.append((start, len(pair_children)))
+
+        # Ages
+        self.age = years_between(self.birth, fill(self.death, now_ordinal(now)))
+        """Age of each individual at death, or now if they are living (Individual.age)."""
+        self.husband_marriage_age = years_between(self.marriage, take(self.birth, self.husband))
+        """Age of the husband of each family at marriage (Family.husband_marriage_age)."""
+        self.wife_marriage_age = years_between(self.marriage, take(self.birth, self.wife))
+        """Age of the wife of each family at marriage (Family.wife_marriage_age)."""
+
+        # Marriages end with the divorce, or the first death of either spouse, see Family.marriage_end
+        first_death = minimum(fill(take(self.death, self.husband), LATEST), fill(take(self.death, self.wife), LATEST))
+        self.marriage_end = fill(self.divorce, first_death)
+        """Day ordinal of the end of each marriage, LATEST if it hasn't ended."""
+
+        # Age gaps between parents and children
+        self.child_birth = child_birth = take(self.birth, pair_children)
+        """Day ordinal of the birth of the child of each pair."""
+        self.mother_gap = years_between(child_birth, take(self.birth, take(self.wife, pair_families, NONE)))
+        """Years between the birth of the child and the birth of the wife of each pair."""
+        self.father_gap = years_between(child_birth, take(self.birth, take(self.husband, pair_families, NONE)))
+        """Years between the birth of the child and the birth of the husband of each pair."""
+
+        # The pairs of each family are next to each other, so sorting all pairs by family and then birth sorts the
+        # children of every family by birth at once.
+        if numpy is not None:
+            self.pairs_by_birth = numpy.lexsort((child_birth, pair_families)).tolist()
+        else:
+            self.pairs_by_birth = sorted(xrange(len(pair_children)), key=lambda p: (pair_families[p], child_birth[p]))
+        """The pairs ordered by family, and by the birth of the child within a family (children without a birth
+        date first)."""
+
+    def marriage_interval(self, f):
+        """ Returns the (start, end) day ordinals of the marriage of a family, start is MISSING if it has no date
+
+        :param f: The index of the family in File.families
+        :type f: int
+
+        """
+        return int(self.marriage[f]), int(self.marriage_end[f])
+
+    def child_births(self, f):
+        """ Returns the birth day ordinal of each child of a family, in the order of Family.children
+
+        :param f: The index of the family in File.families
+        :type f: int
+
+        :rtype: list of int
+
+        """
+        start, stop = self.family_pairs[f]
+        return [int(birth) for birth in self.child_birth[start:stop]]
+
+    def birth_order(self, f):
+        """ Returns the positions in Family.children of the children of a family with a birth date, ordered by birth
+
+        Children born on the same day keep the order of Family.children.
+
+        :param f: The index of the family in File.families
+        :type f: int
+
+        :rtype: list of int
+
+        """
+        start, stop = self.family_pairs[f]
+        return [p - start for p in self.pairs_by_birth[start:stop] if self.child_birth[p] != MISSING]
+
+    def parent_gaps(self, f):
+        """ Returns the (mother gap, father gap) of each child of a family, in the order of Family.children
+
+        :param f: The index of the family in File.families
+        :type f: int
+
+        :rtype: list of tuple
+
+        """
+        start, stop = self.family_pairs[f]
+        return zip(self.mother_gap[start:stop], self.father_gap[start:stop])
+
+
+def overlapping_pairs(intervals):
+    """ Returns every pair of intervals that overlap, by sweeping over the intervals in order of their start
+
+    Intervals include both ends, and two intervals overlap if each starts no later than the other ends. Only the
+    intervals that haven't ended when an interval starts are compared with it, so the time taken grows with the
+    number of intervals and the number of overlaps rather than the number of pairs.
+
+    :param intervals: The (start, end) of each interval
+    :type intervals: list of tuple
+
+    :return: The (a, b) positions, a < b, of each pair of overlapping intervals
+    :rtype: set of tuple
+
+    """
+    pairs = set()
+    active = []  # heap of the (end, position) of the intervals that have started and not ended
+    for k in sorted(xrange(len(intervals)), key=lambda k: intervals[k][0]):
+        start, end = intervals[k]
+        while active and active[0][0] < start:
+            heapq.heappop(active)
+        for other_end, other in active:
+            # The other interval started first and hasn't ended, this one must also end after the other starts.
+            if intervals[other][0] <= end:
+                pairs.add((min(k, other), max(k, other)))
+        heapq.heappush(active, (end, k))
+    return pairs
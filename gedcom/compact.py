@@ -0,0 +1,550 @@
+""" Compact GEDCOM Line Store.
+
+This module provides a memory efficient alternative to parser.File for very large GEDCOM files.
+
+Instead of one Line dictionary per line, the lines are stored in columns: levels in an array of bytes, tags as ids
+into a table of tags, values and xref_IDs as ids into a shared table of strings, and parents and children as arrays
+of line positions. Lines are accessed through CompactLine views that are created when needed.
+
+MappedFile goes further and memory maps the file, keeping only the byte offsets of xref_IDs and values, which are
+decoded when they are accessed.
+
+"""
+# Standard Library Imports
+from array import array
+import mmap
+import os
+import sys
+
+# Project Imports
+import parser
+import tools
+
+
+__author__ = "Constantine Davantzis"
+
+NONE = -1
+"""Integer: Id used in the columns for a missing value, xref_ID or parent."""
+
+
+class StringTable(object):
+    """ Table of unique strings
+
+    Each string is stored once and referred to by its position in the table.
+
+    """
+
+    __slots__ = ("strings", "ids")
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id] if string_id != NONE else None
+
+    def add(self, string):
+        """ Returns the id of a string, adding it to the table if it isn't already in it
+
+        :param string: The string to add, None is stored as NONE
+        :type string: str or None
+
+        :rtype: int
+
+        """
+        if string is None:
+            return NONE
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def find(self, string):
+        """ Returns the id of a string, or None if it is not in the table """
+        if string is None:
+            return NONE
+        return self.ids.get(string)
+
+
+def link_positions(levels):
+    """ Determine the parent and children of every line from the line levels
+
+    :note: This follows the same rules as parser.link_lines
+
+    :param levels: The level of each line
+    :type levels: array
+
+    :return: parents, child_offsets and child_positions arrays. The children of the line at position i are
+    child_positions[child_offsets[i]:child_offsets[i + 1]]
+    :rtype: tuple of array
+
+    """
+    count = len(levels)
+    parents = array('l', [NONE]) * count
+    child_counts = array('l', [0]) * count
+    stack = []
+    for i in xrange(count):
+        level = levels[i]
+        while stack and levels[stack[-1]] >= level:
+            stack.pop()
+        if stack and levels[stack[-1] + 1] == level:
+            parents[i] = stack[-1]
+            child_counts[stack[-1]] += 1
+        stack.append(i)
+    # Children are stored together for each parent, in line order.
+    child_offsets = array('l', [0]) * (count + 1)
+    for i in xrange(count):
+        child_offsets[i + 1] = child_offsets[i] + child_counts[i]
+    child_positions = array('l', [0]) * child_offsets[count]
+    next_child = array('l', child_offsets)
+    for i in xrange(count):
+        p = parents[i]
+        if p != NONE:
+            child_positions[next_child[p]] = i
+            next_child[p] += 1
+    return parents, child_offsets, child_positions
+
+
+class CompactFile(object):
+    """GEDCOM Compact File Class
+
+    A representation of a GEDCOM file as columns of line attributes.
+
+    :note: This class supports the traversing API of parser.File (iterating, indexing by line number, find, find_one
+    and text), but the lines are CompactLine views rather than parser.Line objects, so it can not be used with the
+    classes of the tag module.
+
+    :Example:
+        gedcom_file = CompactFile()
+        gedcom_file.read_file(filename)
+        print gedcom_file.find_one('xref_ID', '@I1@').children.find_one('tag', 'NAME').val
+
+    """
+
+    indexed_keys = ("tag", "level", "xref_ID", "line_value")
+    """Tuple: Keys that find and find_one match by comparing ids in a column instead of values."""
+
+    def __init__(self):
+        """Initiate GEDCOM Compact File Class
+
+        """
+        self.levels = array('B')
+        self.tag_ids = array('l')
+        self.xref_ids = array('l')
+        self.value_ids = array('l')
+        self.parents = array('l')
+        # The children of the line at position i are child_positions[child_offsets[i]:child_offsets[i + 1]]
+        self.child_offsets = array('l', [0])
+        self.child_positions = array('l')
+        self.tags = StringTable()
+        self.strings = StringTable()
+        # Dictionary of xref_ID string id to the position of the first line with that xref_ID
+        self.xref_positions = {}
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __iter__(self):
+        """ Return iterator of CompactLine views for each line """
+        return (CompactLine(self, i) for i in xrange(len(self)))
+
+    def __getitem__(self, line_number):
+        """ Return a CompactLine view of a line based on line number
+
+        :note: The first line starts at 0
+
+        """
+        if line_number < 0:
+            line_number += len(self)
+        if not 0 <= line_number < len(self):
+            raise IndexError("line number out of range")
+        return CompactLine(self, line_number)
+
+    def read_file(self, filename):
+        """Method to read in file from filename or file path
+
+            :param filename: A GEDCOM filename or file path.
+            :type filename: str
+
+        """
+        with open(filename) as filehandle:
+            self.read_lines(line for line in filehandle if line.strip())
+
+    def read_lines(self, line_strings):
+        """Method to read in the lines of a GEDCOM file
+
+            :param line_strings: The text of each non blank line
+            :type line_strings: iterable of str
+
+        """
+        self.__init__()
+        for i, line_string in enumerate(line_strings):
+            try:
+                d = parser.parse_line(line_string.strip())
+            except SyntaxError as errorSyntax:
+                sys.exit("line number {0}: {1}".format(i, errorSyntax.msg))
+            self.levels.append(d["level"])
+            self.tag_ids.append(self.tags.add(d["tag"]))
+            self.xref_ids.append(self.strings.add(d["xref_ID"]))
+            self.value_ids.append(self.strings.add(d["line_value"]))
+            if d["xref_ID"] is not None and self.xref_ids[i] not in self.xref_positions:
+                self.xref_positions[self.xref_ids[i]] = i
+        self.parents, self.child_offsets, self.child_positions = link_positions(self.levels)
+
+    def xref(self, line_number):
+        """ Returns the xref_ID of a line, or None """
+        return self.strings[self.xref_ids[line_number]]
+
+    def value(self, line_number):
+        """ Returns the line_value of a line, or None """
+        return self.strings[self.value_ids[line_number]]
+
+    def xref_position(self, xref):
+        """ Returns the position of the first line with an xref_ID, or None """
+        return self.xref_positions.get(self.strings.find(xref))
+
+    def line_text(self, line_number):
+        """ Returns the text of a line
+
+        :note: The text is rebuilt from the line attributes, so whitespace between them is normalized to one space.
+
+        """
+        parts = [str(self.levels[line_number]), self.xref(line_number), self.tags[self.tag_ids[line_number]],
+                 self.value(line_number)]
+        return " ".join(p for p in parts if p is not None)
+
+    def __value_ids(self, key):
+        """ Returns the column for a key, and a function to turn a value into an id in that column """
+        if key not in self.indexed_keys:
+            return None, None
+        if key == "tag":
+            return self.tag_ids, self.tags.find
+        if key == "level":
+            return self.levels, lambda v: v if isinstance(v, int) and 0 <= v < 256 else None
+        if key == "xref_ID":
+            return self.xref_ids, self.strings.find
+        if key == "line_value":
+            return self.value_ids, self.strings.find
+        return None, None
+
+    def find(self, key, value, positions=None):
+        """ Finds all lines in file that have a matching key and value
+
+        :param key: The key to match
+        :type key: str
+
+        :param value: The value to match
+        :type value: any object that can be in a dictionary.
+
+        :param positions: Only search these line positions, used by CompactSubFile
+        :type positions: list of int
+
+        :return: A list of matched lines, as a CompactSubFile
+        :rtype: CompactSubFile
+
+        """
+        positions = xrange(len(self)) if positions is None else positions
+        column, to_id = self.__value_ids(key)
+        if column is None:
+            return CompactSubFile(self, [i for i in positions if CompactLine(self, i).get(key) == value])
+        value_id = to_id(value)
+        if value_id is None:
+            return CompactSubFile(self, [])
+        return CompactSubFile(self, [i for i in positions if column[i] == value_id])
+
+    def find_one(self, key, value, positions=None):
+        """ Finds FIRST line in file that has a matching key and value
+
+        :return: CompactLine view of the line, or None
+        :rtype: CompactLine
+
+        """
+        if key == "xref_ID" and positions is None:
+            position = self.xref_position(value)
+            return CompactLine(self, position) if position is not None else None
+        positions = xrange(len(self)) if positions is None else positions
+        column, to_id = self.__value_ids(key)
+        if column is None:
+            return next((CompactLine(self, i) for i in positions if CompactLine(self, i).get(key) == value), None)
+        value_id = to_id(value)
+        if value_id is None:
+            return None
+        return next((CompactLine(self, i) for i in positions if column[i] == value_id), None)
+
+    @property
+    def text(self):
+        """ returns the contents of the GEDCOM file as plain text. """
+        return "\n".join(line.text for line in self)
+
+
+class MappedFile(CompactFile):
+    """GEDCOM Memory Mapped File Class
+
+    A CompactFile that memory maps the GEDCOM file instead of copying it. Reading the file is one pass over the
+    bytes that records the level and tag of each line and the byte offsets of the line, its xref_ID and its value.
+    xref_IDs and values are only turned into strings when they are accessed, and are not kept.
+
+    :note: The file stays mapped until close is called or the object is deleted.
+
+    :Example:
+        gedcom_file = MappedFile()
+        gedcom_file.read_file(filename)
+        print gedcom_file.find_one('xref_ID', '@I1@').children.find_one('tag', 'NAME').val
+        gedcom_file.close()
+
+    """
+
+    indexed_keys = ("tag", "level")
+
+    def __init__(self):
+        """Initiate GEDCOM Memory Mapped File Class
+
+        """
+        CompactFile.__init__(self)
+        self.map = None
+        self.line_starts = array('l')
+        self.line_ends = array('l')
+        self.xref_starts = array('l')
+        self.xref_ends = array('l')
+        self.value_starts = array('l')
+        self.value_ends = array('l')
+        # Dictionary of xref_ID to line position, built the first time an xref_ID is looked up.
+        self.xref_positions = None
+
+    def read_file(self, filename):
+        """Method to map a file from filename or file path
+
+            :param filename: A GEDCOM filename or file path.
+            :type filename: str
+
+        """
+        self.close()
+        self.__init__()
+        with open(filename, "rb") as filehandle:
+            # Empty files can't be mapped, they have no lines.
+            if os.fstat(filehandle.fileno()).st_size > 0:
+                self.map = mmap.mmap(filehandle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map is not None:
+            self.__scan()
+        self.parents, self.child_offsets, self.child_positions = link_positions(self.levels)
+
+    def read_lines(self, line_strings):
+        """ Not supported, a MappedFile can only be read from a file """
+        raise TypeError("MappedFile can only read from a file, use CompactFile to read lines")
+
+    def __scan(self):
+        """ Record the level, tag and byte offsets of each non blank line of the mapped file """
+        m, size, pos = self.map, len(self.map), 0
+        match = parser.gedcom_line_regex.match
+        while pos < size:
+            end = m.find("\n", pos)
+            end = size if end == -1 else end
+            start, stop, pos = pos, end, end + 1
+            # Strip the line without copying it.
+            while start < stop and m[start] in parser.WHITESPACE:
+                start += 1
+            while stop > start and m[stop - 1] in parser.WHITESPACE:
+                stop -= 1
+            if start == stop:
+                continue
+            found = match(m, start, stop)
+            if found:
+                level, tag = int(found.group("level")), found.group("tag")
+                spans = found.span("xref_ID"), found.span("line_value")
+            else:
+                # Lines the regex doesn't match are read by parse_line, and their parts found in the line text
+                text = m[start:stop]
+                try:
+                    line_dict = parser.parse_line(text)
+                except SyntaxError as errorSyntax:
+                    sys.exit("line number {0}: {1}".format(len(self.levels), errorSyntax.msg))
+                level, tag = line_dict["level"], line_dict["tag"]
+                spans = self.__span(text, start, line_dict.get("xref_ID"), text.find), \
+                    self.__span(text, start, line_dict.get("line_value"), text.rfind)
+            self.levels.append(level)
+            self.tag_ids.append(self.tags.add(tag))
+            self.line_starts.append(start)
+            self.line_ends.append(stop)
+            for starts, ends, span in ((self.xref_starts, self.xref_ends, spans[0]),
+                                       (self.value_starts, self.value_ends, spans[1])):
+                starts.append(span[0])
+                ends.append(span[1])
+
+    @staticmethod
+    def __span(text, start, part, find):
+        """ Returns the (start, end) byte offsets of a part of a line in the mapped file, or (NONE, NONE) """
+        if part is None:
+            return NONE, NONE
+        offset = find(part)
+        if offset == -1:
+            sys.exit("line {0!r}: could not locate {1!r}".format(text, part))
+        return start + offset, start + offset + len(part)
+
+    def close(self):
+        """ Unmap the file """
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def xref(self, line_number):
+        """ Returns the xref_ID of a line, or None """
+        start = self.xref_starts[line_number]
+        return self.map[start:self.xref_ends[line_number]] if start != NONE else None
+
+    def value(self, line_number):
+        """ Returns the line_value of a line, or None """
+        start = self.value_starts[line_number]
+        return self.map[start:self.value_ends[line_number]] if start != NONE else None
+
+    def xref_position(self, xref):
+        """ Returns the position of the first line with an xref_ID, or None """
+        if self.xref_positions is None:
+            self.xref_positions = {}
+            for i in xrange(len(self)):
+                if self.xref_starts[i] != NONE:
+                    self.xref_positions.setdefault(self.xref(i), i)
+        return self.xref_positions.get(xref)
+
+    def line_text(self, line_number):
+        """ Returns the text of a line, exactly as it is in the file without surrounding whitespace """
+        return self.map[self.line_starts[line_number]:self.line_ends[line_number]]
+
+
+class CompactSubFile(object):
+    """GEDCOM Compact SubFile Class
+
+    A part of a CompactFile, given as the positions of its lines. This has the same role as parser.SubFile.
+
+    """
+
+    __slots__ = ("file", "positions")
+
+    def __init__(self, compact_file, positions):
+        self.file = compact_file
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return (CompactLine(self.file, i) for i in self.positions)
+
+    def __getitem__(self, i):
+        return CompactLine(self.file, self.positions[i])
+
+    def __str__(self):
+        return str(list(self))
+
+    def find(self, key, value):
+        return self.file.find(key, value, self.positions)
+
+    def find_one(self, key, value):
+        return self.file.find_one(key, value, self.positions)
+
+    @property
+    def text(self):
+        return "\n".join(line.text for line in self)
+
+
+class CompactLine(object):
+    """GEDCOM Compact Line Class
+
+    A view of one line of a CompactFile. This keeps the API of parser.Line (tag, val, ln, children, parent,
+    follow_xref, datetime, story_dict, get) while only holding the file and the position of the line.
+
+    """
+
+    __slots__ = ("file", "line_number")
+
+    def __init__(self, compact_file, line_number):
+        self.file = compact_file
+        self.line_number = line_number
+
+    def __eq__(self, other):
+        return isinstance(other, CompactLine) and self.file is other.file and self.line_number == other.line_number
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.file), self.line_number))
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+    def get(self, key, default=None):
+        """ Returns a value of the line by its parser.Line dictionary key """
+        f, i = self.file, self.line_number
+        if key == "level":
+            return f.levels[i]
+        if key == "tag":
+            return f.tags[f.tag_ids[i]]
+        if key == "xref_ID":
+            return f.xref(i)
+        if key == "line_value":
+            return f.value(i)
+        if key == "line_number":
+            return i
+        if key == "isTagSupported":
+            return self.tag in parser.SUPPORTED_TAGS
+        if key == "children_line_numbers":
+            return f.child_positions[f.child_offsets[i]:f.child_offsets[i + 1]].tolist()
+        if key == "parent_line_numbers":
+            return [f.parents[i]] if f.parents[i] != NONE else []
+        return default
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def as_dict(self):
+        """ Returns the line as a dictionary with the same keys as a parser.Line """
+        keys = ("level", "xref_ID", "tag", "line_value", "isTagSupported", "line_number",
+                "children_line_numbers", "parent_line_numbers")
+        return dict((key, self.get(key)) for key in keys)
+
+    @property
+    def text(self):
+        """ GEDCOM Line as Text, see CompactFile.line_text """
+        return self.file.line_text(self.line_number)
+
+    @property
+    def children(self):
+        """ Returns the children of this line as a CompactSubFile """
+        f, i = self.file, self.line_number
+        return CompactSubFile(f, f.child_positions[f.child_offsets[i]:f.child_offsets[i + 1]])
+
+    @property
+    def parent(self):
+        """ Returns the parent line of this line, or None if the line has no parent """
+        p = self.file.parents[self.line_number]
+        return CompactLine(self.file, p) if p != NONE else None
+
+    def follow_xref(self):
+        """ Search file lines with an xref_id equal to this lines line_value """
+        return self.file.find_one('xref_ID', self.get("line_value"))
+
+    @property
+    def ln(self):
+        return self.line_number + 1
+
+    @property
+    def tag(self):
+        return self.get("tag")
+
+    @property
+    def val(self):
+        return self.get("line_value", "")
+
+    @property
+    def datetime(self):
+        if self.tag == "DATE":
+            return tools.parse_date(self.get("line_value"))
+        return None
+
+    @property
+    def story_dict(self):
+        return {"line_number": self.ln, "line_value": self.val}
@@ -0,0 +1,113 @@
+""" GEDCOM Event Table.
+
+This module provides a table of the birth and death of every individual, and the marriage and divorce of every family,
+in a GEDCOM file.
+
+The table is built once per File (see parser.File.events) in a single pass over the lines, and holds the packed date
+(see tools.pack_date) and the line number of the DATE line of each event. Individuals and families are referred to by
+their index in File.individuals and File.families.
+
+"""
+
+# Local Imports
+import tag
+import tools
+
+__author__ = "Constantine Davantzis"
+
+EVENTS = {"BIRT": "INDI", "DEAT": "INDI", "MARR": "FAM", "DIV": "FAM"}
+"""Dictionary: The tag of the record each event belongs to."""
+
+
+class EventTable(object):
+    """GEDCOM Event Table Class
+
+    Only the first event line of each record, and the first DATE line of that event, are used, the same as
+    Individual.birth_date, Individual.death_date, Family.marriage_date and Family.divorce_date.
+
+    :Example:
+        events = gedcom_file.events
+        for indi in gedcom_file.individuals:
+            print indi, events.date("BIRT", indi.line)
+
+    """
+
+    def __init__(self, gedcom_file):
+        """Build the Event Table of a File
+
+        :param gedcom_file: The GEDCOM File to build the table of
+        :type gedcom_file: parser.File
+
+        """
+        self.file = gedcom_file
+        self.happened = dict((event, []) for event in EVENTS)
+        """True for each record with the event, even if it has no date."""
+        self.line_number = dict((event, []) for event in EVENTS)
+        """Line number of the DATE line of the event of each record, or None."""
+        self.packed = dict((event, []) for event in EVENTS)
+        """Packed date of the event of each record, or None if there is no date or it isn't legitimate (see US42)."""
+        self.__index = {}
+
+        counts = {"INDI": 0, "FAM": 0}
+        records = {"INDI": [event for event in EVENTS if EVENTS[event] == "INDI"],
+                   "FAM": [event for event in EVENTS if EVENTS[event] == "FAM"]}
+        waiting = {}  # the (event, index) of each first event line that hasn't had a DATE line yet
+        for line in gedcom_file.lines:
+            line_tag = line.get("tag")
+            if line_tag in counts:
+                self.__index[id(line)] = counts[line_tag]
+                counts[line_tag] += 1
+                for event in records[line_tag]:
+                    self.happened[event].append(False)
+                    self.line_number[event].append(None)
+                    self.packed[event].append(None)
+            elif line_tag in EVENTS or line_tag == "DATE":
+                parent = line.parent
+                if parent is None:
+                    continue
+                if line_tag == "DATE":
+                    event, i = waiting.pop(id(parent), (None, None))
+                    if event is not None:
+                        self.line_number[event][i] = line["line_number"]
+                        self.packed[event][i] = self.__pack(line.get("line_value"))
+                elif parent.get("tag") == EVENTS[line_tag] and id(parent) in self.__index:
+                    i = self.__index[id(parent)]
+                    if not self.happened[line_tag][i]:
+                        self.happened[line_tag][i] = True
+                        waiting[id(line)] = (line_tag, i)
+
+    @staticmethod
+    def __pack(value):
+        try:
+            return tools.pack_date(value) if isinstance(value, basestring) else None
+        except ValueError:
+            return None
+
+    def index(self, line):
+        """ Returns the index of an INDI or FAM line, or None if it is not a record of this table """
+        return self.__index.get(id(line))
+
+    def date(self, event, line):
+        """ Returns the date of an event of an INDI or FAM line as a tag.Date
+
+        :param event: "BIRT", "DEAT", "MARR" or "DIV"
+        :type event: str
+
+        :param line: The INDI line of a "BIRT" or "DEAT" event, or the FAM line of a "MARR" or "DIV" event
+        :type line: parser.Line
+
+        :return: The same as Individual.birth_date and Individual.death_date (None if there is no date), or
+        Family.marriage_date and Family.divorce_date (a Date of no line if the event has no date). None if the date
+        isn't legitimate, see tag.wrap_date.
+        :rtype: tag.Date or None
+
+        """
+        i = self.__index.get(id(line))
+        if i is None or line.get("tag") != EVENTS[event]:
+            return None
+        line_number = self.line_number[event][i]
+        if line_number is not None:
+            return self.file.wrap(tag.Date, self.file[line_number]) if self.packed[event][i] is not None else None
+        if EVENTS[event] == "FAM" and self.happened[event][i]:
+            return tag.wrap(tag.Date, None)
+        return None
@@ -0,0 +1,280 @@
+""" GEDCOM Kinship Graph.
+
+This module provides a graph of the parent, child and spouse relationships of the individuals in a GEDCOM file.
+
+The graph is built once per File (see parser.File.kinship) by following every FAMC, FAMS, HUSB, WIFE and CHIL
+pointer one time. Individuals and families are referred to by their index in the graph, and the relationship
+properties of tag.Individual are lookups in its lists.
+
+"""
+
+# Standard Library Imports
+import random
+
+
+__author__ = "Constantine Davantzis"
+
+NONE = -1
+"""Integer: Index used for a missing husband or wife."""
+
+
+class KinshipGraph(object):
+    """GEDCOM Kinship Graph Class
+
+    :note: Pointers are followed with Line.follow_xref, so an xref_ID found on more than one line points to the
+    first one, and pointers to lines that are not INDI or FAM lines are ignored.
+
+    :Example:
+        graph = gedcom_file.kinship
+        i = graph.index(gedcom_file.find_one('xref_ID', '@I1@'))
+        print [graph.individuals[s] for s in graph.siblings(i)]
+
+    """
+
+    def __init__(self, gedcom_file):
+        """Build the Kinship Graph of a File
+
+        :param gedcom_file: The GEDCOM File to build the graph of
+        :type gedcom_file: parser.File
+
+        """
+        self.individuals = list(gedcom_file.find("tag", "INDI"))
+        """List of the INDI lines, the index of a line in this list is the index of the individual."""
+        self.families = list(gedcom_file.find("tag", "FAM"))
+        """List of the FAM lines, the index of a line in this list is the index of the family."""
+        self.xrefs = [line.get("xref_ID") for line in self.individuals]
+
+        self.__individual_index = dict((id(line), i) for i, line in enumerate(self.individuals))
+        self.__family_index = dict((id(line), f) for f, line in enumerate(self.families))
+
+        # Family lists of each individual, in the order of the FAMC and FAMS lines.
+        self.child_in = [self.__follow(line, "FAMC", self.__family_index) for line in self.individuals]
+        self.spouse_in = [self.__follow(line, "FAMS", self.__family_index) for line in self.individuals]
+
+        # Husband, wife and children of each family.
+        self.husband = [next(iter(self.__follow(line, "HUSB", self.__individual_index, first=True)), NONE)
+                        for line in self.families]
+        self.wife = [next(iter(self.__follow(line, "WIFE", self.__individual_index, first=True)), NONE)
+                     for line in self.families]
+        self.family_children = [self.__follow(line, "CHIL", self.__individual_index) for line in self.families]
+
+        # Adjacency lists of each individual.
+        self.children = [[c for f in families for c in self.family_children[f]] for families in self.spouse_in]
+        """Children of each individual, parent to child."""
+        self.parents = [[p for role, p in self.parent_roles(i)] for i in xrange(len(self.individuals))]
+        """Parents of each individual, child to parent."""
+        self.spouses = [[(f, s) for f in families for s in (self.husband[f], self.wife[f])
+                         if s != NONE and self.xrefs[s] != self.xrefs[i]] for i, families in enumerate(self.spouse_in)]
+        """Family and spouse of each marriage of each individual."""
+        self.__ancestry = None
+
+    @staticmethod
+    def __follow(line, tag, index, first=False):
+        """ Returns the indexes of the lines pointed to by the children of a line with a tag
+
+        """
+        pointers = line.children.find("tag", tag)
+        if first:
+            pointers = pointers.lines[:1]
+        targets = (index.get(id(pointer.follow_xref())) for pointer in pointers)
+        return [target for target in targets if target is not None]
+
+    def index(self, line):
+        """ Returns the index of an INDI line, or None if it is not an individual of this graph """
+        return self.__individual_index.get(id(line))
+
+    def family_index(self, line):
+        """ Returns the index of a FAM line, or None if it is not a family of this graph """
+        return self.__family_index.get(id(line))
+
+    def siblings(self, i):
+        """ Returns the (family, sibling) of each sibling of an individual, in the order of the families """
+        return [(f, c) for f in self.child_in[i] for c in self.family_children[f] if self.xrefs[c] != self.xrefs[i]]
+
+    def parent_roles(self, i):
+        """ Returns the (role, parent) of each parent of an individual, where role is "HUSB" or "WIFE" """
+        return [(role, p) for f in self.child_in[i] for role, p in (("HUSB", self.husband[f]), ("WIFE", self.wife[f]))
+                if p != NONE]
+
+    def aunts_and_uncles(self, i):
+        """ Returns the (role, parent, aunt or uncle) of each sibling of each parent of an individual """
+        return [(role, p, s) for role, p in self.parent_roles(i) for f, s in self.siblings(p)]
+
+    def cousins(self, i):
+        """ Returns the children of each sibling of each parent of an individual """
+        return [c for role, p, s in self.aunts_and_uncles(i) for c in self.children[s]]
+
+    @property
+    def ancestry(self):
+        """ The Ancestry engine of this graph, built the first time it is used
+
+        :rtype: Ancestry
+
+        """
+        if self.__ancestry is None:
+            self.__ancestry = Ancestry(self.children)
+        return self.__ancestry
+
+
+def generation_title(generation):
+    """ Returns the title of a descendant of a generation, e.g. 1 is "child" and 3 is "great-grandchild"
+
+    :param generation: The number of generations between the ancestor and the descendant
+    :type generation: int
+
+    :rtype: str
+
+    """
+    if generation == 1:
+        return "child"
+    if generation == 2:
+        return "grandchild"
+    return (generation - 2) * "great-" + "grandchild"
+
+
+class Ancestry(object):
+    """Ancestry Engine Class
+
+    Answers "is A an ancestor of B" and lists descendants over the parent to child graph of a KinshipGraph.
+
+    Each individual gets a depth (the longest line of ancestors above it) and LABELINGS intervals from depth first
+    searches that visit children in random orders. If A is an ancestor of B then A has a lower depth than B and every
+    interval of B is inside the interval of A, so most pairs that are not related are answered without searching.
+    Searches from A only go into children that can still reach B by the same test.
+
+    :note: A GEDCOM file with errors can make an individual their own ancestor. The depth and interval tests only
+    hold when there is no such cycle, so they are not used if the graph has one.
+
+    :note: Everything is built without recursion, so deep trees (e.g. 1M individuals) are supported.
+
+    """
+
+    LABELINGS = 2
+    """Integer: The number of random depth first search interval labelings."""
+
+    def __init__(self, children, seed=555):
+        """Build the Ancestry Engine
+
+        :param children: The children of each individual, by index (see KinshipGraph.children)
+        :type children: list of list of int
+
+        :param seed: Seed for the random orders of the labelings, so results are repeatable
+        :type seed: int
+
+        """
+        self.children = children
+        self.depth, self.has_cycle = self.__depths(children)
+        self.labels = []
+        if not self.has_cycle:
+            rand = random.Random(seed)
+            for _ in xrange(self.LABELINGS):
+                self.labels.append(self.__label(children, rand))
+
+    @staticmethod
+    def __depths(children):
+        """ Returns the depth of each individual, and if the graph has a cycle, in topological order (Kahn) """
+        count = len(children)
+        parent_counts = [0] * count
+        for kids in children:
+            for c in kids:
+                parent_counts[c] += 1
+        depth = [0] * count
+        ready = [i for i in xrange(count) if parent_counts[i] == 0]
+        done = 0
+        while ready:
+            i = ready.pop()
+            done += 1
+            for c in children[i]:
+                if depth[c] < depth[i] + 1:
+                    depth[c] = depth[i] + 1
+                parent_counts[c] -= 1
+                if parent_counts[c] == 0:
+                    ready.append(c)
+        return depth, done < count
+
+    @staticmethod
+    def __label(children, rand):
+        """ Returns the (low, rank) interval of each individual from one randomized depth first search
+
+        rank is the post-order number of the individual, and low is the lowest rank of it and its descendants.
+
+        """
+        count = len(children)
+        rank, low = [-1] * count, [0] * count
+        next_rank = 0
+        roots = range(count)
+        rand.shuffle(roots)
+        for root in roots:
+            if rank[root] != -1:
+                continue
+            rank[root] = -2  # on the stack
+            stack = [(root, rand.sample(children[root], len(children[root])))]
+            while stack:
+                i, todo = stack[-1]
+                if todo:
+                    c = todo.pop()
+                    if rank[c] == -1:
+                        rank[c] = -2
+                        stack.append((c, rand.sample(children[c], len(children[c]))))
+                    continue
+                stack.pop()
+                rank[i] = next_rank
+                next_rank += 1
+                low[i] = min([rank[i]] + [low[c] for c in children[i]])
+        return zip(low, rank)
+
+    def may_reach(self, a, b):
+        """ Returns False if b is certainly not a descendant of a (or a itself), True if it might be """
+        if self.has_cycle:
+            return True
+        if a != b and self.depth[a] >= self.depth[b]:
+            return False
+        for labels in self.labels:
+            low_a, rank_a = labels[a]
+            low_b, rank_b = labels[b]
+            if low_b < low_a or rank_b > rank_a:
+                return False
+        return True
+
+    def generations(self, a, b):
+        """ Returns the number of generations from ancestor a down to descendant b, or None if b is not a descendant
+
+        :rtype: int or None
+
+        """
+        if not self.may_reach(a, b):
+            return None
+        checked, current, generation = set(), [a], 1
+        while current:
+            new = []
+            for i in current:
+                for c in self.children[i]:
+                    if c == b:
+                        return generation
+                    if c not in checked and self.may_reach(c, b):
+                        checked.add(c)
+                        new.append(c)
+            current, generation = new, generation + 1
+        return None
+
+    def is_ancestor(self, a, b):
+        """ Returns True if a is an ancestor of b """
+        return self.generations(a, b) is not None
+
+    def descendants(self, a):
+        """ Returns the (descendant, generation) of every descendant of a, a generation at a time
+
+        Each descendant is listed once, with the lowest generation it is found in.
+
+        """
+        r, checked, current, generation = [], set(), [a], 1
+        while current:
+            new = []
+            for i in current:
+                for c in self.children[i]:
+                    if c not in checked:
+                        checked.add(c)
+                        new.append(c)
+            r.extend((c, generation) for c in new)
+            current, generation = new, generation + 1
+        return r
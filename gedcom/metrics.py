@@ -0,0 +1,193 @@
+""" GEDCOM Run Metrics.
+
+This module counts and times the hot primitives of the parser (File.find, File.find_one, Line.follow_xref and
+tools.parse_date), and times the stories, so that the parts that dominate a run can be found.
+
+Nothing is measured until enable is called, which wraps the primitives with counting timers, disable puts the
+original functions back so that they cost nothing when metrics aren't wanted.
+
+:note: The time of a primitive includes the primitives it calls, e.g. Line.follow_xref includes the File.find_one
+it uses to look up the record.
+
+:note: The memory of a story is how much the peak resident memory of the process grew while it ran (see
+resource.getrusage), tracemalloc isn't available in Python 2. Memory freed and reused within a story isn't counted.
+
+"""
+
+# Standard Library Imports
+import resource
+from timeit import default_timer
+
+# Local Imports
+import parser
+import tag
+import tools
+
+__author__ = "Constantine Davantzis"
+
+PRIMITIVES = ((parser.File, "find", "File.find"),
+              (parser.File, "find_one", "File.find_one"),
+              (parser.Line, "follow_xref", "Line.follow_xref"),
+              (tools, "parse_date", "tools.parse_date"))
+"""Tuple: The (owner, attribute, name) of each primitive that is counted and timed."""
+
+_originals = {}
+_primitives = {}  # name: [calls, seconds]
+_stories = {}  # story id: [seconds, peak memory growth]
+_stories_order = []
+_cache = {}  # cached property: [hits, misses] counted by other processes, see merge
+
+
+def enabled():
+    """ Returns True if metrics are being collected """
+    return bool(_originals)
+
+
+def enable():
+    """ Start counting and timing the primitives, and timing stories run with story_timer """
+    if _originals:
+        return
+    for owner, attribute, name in PRIMITIVES:
+        original = vars(owner)[attribute]
+        _originals[(owner, attribute)] = original
+        setattr(owner, attribute, _counted(name, original))
+
+
+def disable():
+    """ Stop collecting metrics, and put the original primitives back. The metrics collected are kept. """
+    for (owner, attribute), original in _originals.items():
+        setattr(owner, attribute, original)
+    _originals.clear()
+
+
+def reset():
+    """ Forget the metrics collected, including the cached property hits and misses of tag.cache_info """
+    _primitives.clear()
+    _stories.clear()
+    del _stories_order[:]
+    _cache.clear()
+    tag.reset_cache_info()
+
+
+def _counted(name, function):
+    """ Returns function wrapped to count its calls and add up their time as the primitive name """
+    def counted_function(*args, **kwargs):
+        start = default_timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            totals = _primitives.get(name)
+            if totals is None:
+                totals = _primitives[name] = [0, 0.0]
+            totals[0] += 1
+            totals[1] += default_timer() - start
+
+    counted_function.__name__ = function.__name__
+    counted_function.__doc__ = function.__doc__
+    return counted_function
+
+
+def peak_memory():
+    """ Returns the peak resident memory of this process in kilobytes """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def story_timer(story_id, function):
+    """ Returns function wrapped to add its time and peak memory growth to a story, or function itself if metrics
+    aren't enabled
+
+    If a story is run more than once, its times are added up.
+
+    :param story_id: The id of the story, e.g. "Error US01"
+    :type story_id: str
+
+    """
+    if not _originals:
+        return function
+    if story_id not in _stories:
+        _stories[story_id] = [0.0, 0]
+        _stories_order.append(story_id)
+    totals = _stories[story_id]
+
+    def timed_function(*args, **kwargs):
+        start, before = default_timer(), peak_memory()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            totals[0] += default_timer() - start
+            totals[1] += peak_memory() - before
+
+    return timed_function
+
+
+def snapshot():
+    """ Returns the metrics collected by this process in a form that can be sent to another process, see merge """
+    return {"primitives": dict((name, list(totals)) for name, totals in _primitives.iteritems()),
+            "stories": [(story_id, list(_stories[story_id])) for story_id in _stories_order],
+            "cache": dict((name, list(counts)) for name, counts in tag.cache_info()["properties"].iteritems())}
+
+
+def merge(other):
+    """ Add the metrics collected by another process (e.g. a worker of stories.run_stories_parallel) to this one
+
+    :param other: The snapshot of the other process
+    :type other: dict
+
+    """
+    for name, (calls, seconds) in other["primitives"].iteritems():
+        totals = _primitives.setdefault(name, [0, 0.0])
+        totals[0] += calls
+        totals[1] += seconds
+    for story_id, (seconds, memory) in other["stories"]:
+        if story_id not in _stories:
+            _stories[story_id] = [0.0, 0]
+            _stories_order.append(story_id)
+        _stories[story_id][0] += seconds
+        _stories[story_id][1] += memory
+    for name, (hits, misses) in other["cache"].iteritems():
+        counts = _cache.setdefault(name, [0, 0])
+        counts[0] += hits
+        counts[1] += misses
+
+
+def report():
+    """ Returns the metrics collected, as saved in the "metrics" section of log.json
+
+    :rtype: dict
+
+    """
+    cache = tag.cache_info()
+    properties = dict((name, list(counts)) for name, counts in cache["properties"].iteritems())
+    for name, (hits, misses) in _cache.iteritems():
+        counts = properties.setdefault(name, [0, 0])
+        counts[0] += hits
+        counts[1] += misses
+    return {"primitives": dict((name, {"calls": calls, "seconds": round(seconds, 6)})
+                               for name, (calls, seconds) in _primitives.iteritems()),
+            "stories": [{"id": story_id, "seconds": round(_stories[story_id][0], 6),
+                         "peak_memory_kb": _stories[story_id][1]} for story_id in _stories_order],
+            "cache": {"hits": sum(h for h, m in properties.values()),
+                      "misses": sum(m for h, m in properties.values()),
+                      "properties": dict((name, {"hits": h, "misses": m}) for name, (h, m) in properties.iteritems())}}
+
+
+def summary_table(metrics):
+    """ Returns the lines of a plain text table of a metrics report, slowest first
+
+    :param metrics: A metrics report, see report
+    :type metrics: dict
+
+    :rtype: list of str
+
+    """
+    lines = ["{0:<28} {1:>10} {2:>10}".format("story", "seconds", "peak KB"), "-" * 50]
+    for entry in sorted(metrics["stories"], key=lambda entry: -entry["seconds"]):
+        lines.append("{0:<28} {1:>10.4f} {2:>10}".format(entry["id"], entry["seconds"], entry["peak_memory_kb"]))
+    lines += ["", "{0:<28} {1:>10} {2:>10} {3:>10}".format("primitive", "seconds", "calls", "usec/call"), "-" * 61]
+    for name, totals in sorted(metrics["primitives"].iteritems(), key=lambda item: -item[1]["seconds"]):
+        calls = totals["calls"]
+        lines.append("{0:<28} {1:>10.4f} {2:>10} {3:>10.2f}".format(name, totals["seconds"], calls,
+                                                                     totals["seconds"] / calls * 1e6 if calls else 0))
+    cache = metrics["cache"]
+    lines += ["", "cached properties: {0} hits, {1} misses".format(cache["hits"], cache["misses"])]
+    return lines
@@ -0,0 +1,87 @@
+""" GEDCOM Name Index.
+
+This module provides an index of the names of the individuals in a GEDCOM file.
+
+The index is built once per File (see parser.File.names) by reading the first NAME line of every individual one
+time. Individuals are referred to by their index in File.individuals, which is also their kinship_index.
+
+"""
+
+__author__ = "Constantine Davantzis"
+
+
+def split_name(value):
+    """ Split the value of a NAME line into its given name, surname and full name
+
+    The surname is the text between the first two slashes, e.g. "John /Smith/" has the given name "John", the surname
+    "Smith" and the full name "John Smith".
+
+    :param value: The value of a NAME line
+    :type value: str
+
+    :return: given name (the text before the first slash), surname (None if there are less than two slashes) and full
+    name (the value without slashes)
+    :rtype: tuple
+
+    """
+    first = value.find("/")
+    if first == -1:
+        return value.strip(), None, value
+    second = value.find("/", first + 1)
+    surname = value[first + 1:second].strip() if second != -1 else None
+    return value[:first].strip(), surname, value.replace("/", "")
+
+
+class NameIndex(object):
+    """GEDCOM Name Index Class
+
+    :Example:
+        names = gedcom_file.names
+        print [gedcom_file.individuals[i] for i in names.by_surname.get("Smith", [])]
+
+    """
+
+    def __init__(self, gedcom_file):
+        """Build the Name Index of a File
+
+        :param gedcom_file: The GEDCOM File to build the index of
+        :type gedcom_file: parser.File
+
+        """
+        self.given, self.surname, self.full = [], [], []
+        """Given name, surname and full name of each individual, None if they have no NAME line or value."""
+        self.by_given, self.by_surname, self.by_full = {}, {}, {}
+        """The indexes of the individuals with each given name, surname and full name, in the order of the file."""
+        self.__individual_index = {}
+
+        for i, line in enumerate(gedcom_file.find("tag", "INDI")):
+            self.__individual_index[id(line)] = i
+            given, surname, full = self.__read(line)
+            self.given.append(given)
+            self.surname.append(surname)
+            self.full.append(full)
+            for index, key in ((self.by_given, given), (self.by_surname, surname), (self.by_full, full)):
+                if key is not None:
+                    index.setdefault(key, []).append(i)
+
+    def index(self, line):
+        """ Returns the index of an INDI line, or None if it is not an individual of this index """
+        return self.__individual_index.get(id(line))
+
+    def names_of(self, line):
+        """ Returns the (given name, surname, full name) of an INDI line, see split_name
+
+        Each name is None if the line has no NAME line with a value.
+
+        """
+        i = self.__individual_index.get(id(line))
+        if i is not None:
+            return self.given[i], self.surname[i], self.full[i]
+        return self.__read(line)
+
+    @staticmethod
+    def __read(line):
+        """ Returns the names of the first NAME line of an INDI line """
+        name = line.children.find_one("tag", "NAME")
+        value = name.get("line_value") if name is not None else None
+        return split_name(value) if value is not None else (None, None, None)
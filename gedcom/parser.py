@@ -5,11 +5,16 @@ This module provides a way of parsing and traversing through a GEDCOM file.
 """
 # Standard Library Imports
 import json
+import multiprocessing
 import re
 from itertools import ifilter, imap
 import sys
 
 # Project Imports
+import ages
+import events
+import kinship
+import names
 import tag
 import tools
 
@@ -23,27 +28,313 @@ SUPPORTED_TAGS = ["INDI", "NAME", "SEX", "BIRT", "DEAT", "FAMC", "FAMS", "FAM",
                   "MARR", "HUSB", "WIFE", "CHIL", "DIV", "DATE", "HEAD", "TRLR", "NOTE"]
 """A list of tags supported by the project."""
 
+SUPPORTED_TAG_SET = frozenset(SUPPORTED_TAGS)
+"""A set of tags supported by the project, for fast membership checks."""
+
+LEVELS = dict((str(level), level) for level in range(100))
+"""Dictionary of each level string allowed by gedcom_line_regex to its integer value."""
+
+WHITESPACE = " \t\n\r\x0b\x0c"
+"""String: The characters matched by \\s in gedcom_line_regex."""
+
+INDEX_MIN_LINES = 32
+"""Integer: Files and SubFiles with fewer lines than this are searched linearly instead of being indexed."""
+
+CHUNK_LINES = 20000
+"""Integer: The number of lines in each chunk given to a worker process by File.read_file_parallel."""
+
+ORDER_GAP = 1 << 32
+"""Integer: The difference between the orders of consecutive records when they are made, see Record.order."""
+
+DERIVED = {"kinship": (), "ancestry": ("kinship",), "ages": ("kinship",), "names": (), "events": ()}
+"""Dictionary: The derived datasets of a File that File.prepare can build, and the datasets each is built from."""
+
 
 def parse_line(gedcom_line_str):
     """ Parse GEDCOM line into dictionary
 
+    Most lines are split by split_line, lines it can't handle are parsed by parse_line_regex.
+
+    :param gedcom_line_str: A GEDCOM line
+    :type gedcom_line_str: str
+
+    :returns: Dictionary of GEDCOM line
+    :rtype: dict
+
+    :raises SyntaxError: if the line does not match gedcom_line_regex
+
+    """
+    gedcom_line_dict = split_line(gedcom_line_str)
+    if gedcom_line_dict is None:
+        return parse_line_regex(gedcom_line_str)
+    return gedcom_line_dict
+
+
+def split_line(gedcom_line_str):
+    """ Parse a simple GEDCOM line into dictionary by splitting it on spaces
+
+    This handles lines of the form "level [xref_ID] TAG [line_value]" separated by single spaces, where the tag is
+    alphanumeric. For these lines the result is the same as parse_line_regex.
+
+    :param gedcom_line_str: A GEDCOM line
+    :type gedcom_line_str: str
+
+    :returns: Dictionary of GEDCOM line, or None if the line is not simple
+    :rtype: dict
+
+    """
+    if "\n" in gedcom_line_str:
+        return None
+    parts = gedcom_line_str.split(" ", 2)
+    count = len(parts)
+    if count < 2:
+        return None
+    level = LEVELS.get(parts[0])
+    if level is None:
+        return None
+    tag = parts[1]
+    if tag[:1] == "@":
+        xref_ID = tag
+        if count < 3 or len(xref_ID) < 3 or xref_ID[-1] != "@" or len(xref_ID.split()) != 1:
+            return None
+        tag_and_value = parts[2].split(" ", 1)
+        tag = tag_and_value[0]
+        line_value = tag_and_value[1] if len(tag_and_value) == 2 else None
+    else:
+        xref_ID = None
+        line_value = parts[2] if count == 3 else None
+    is_tag_supported = tag in SUPPORTED_TAG_SET
+    if not (is_tag_supported or tag.isalnum()):
+        return None
+    if line_value is not None:
+        line_value = line_value.lstrip(WHITESPACE) or None
+    return {"level": level, "xref_ID": xref_ID, "tag": tag, "line_value": line_value,
+            "isTagSupported": is_tag_supported}
+
+
+def parse_line_regex(gedcom_line_str):
+    """ Parse GEDCOM line into dictionary using gedcom_line_regex
+
     :param gedcom_line_str: A GEDCOM line
     :type gedcom_line_str: str
 
     :returns: Dictionary of GEDCOM line
     :rtype: dict
 
+    :raises SyntaxError: if the line does not match gedcom_line_regex
+
     """
     gedcom_line_matches_format = gedcom_line_regex.match(gedcom_line_str)
     if not gedcom_line_matches_format:
         raise SyntaxError('gedcom_line "{0}" does not have syntax '.format(gedcom_line_str) +
                           '"level + delim + [optional_xref_ID] + tag + [optional_line_value] + terminator"')
     gedcom_line_dict = gedcom_line_matches_format.groupdict()
-    gedcom_line_dict['isTagSupported'] = gedcom_line_dict['tag'] in SUPPORTED_TAGS
+    gedcom_line_dict['isTagSupported'] = gedcom_line_dict['tag'] in SUPPORTED_TAG_SET
     gedcom_line_dict['level'] = int(gedcom_line_dict['level'])
     return gedcom_line_dict
 
 
+def link_lines(lines):
+    """ Determine which lines are parents and children of one another in a single pass
+
+    A line is a child of the closest line before it with a lower level, as long as the line directly after that
+    parent has the same level as the child. The lines that are still open are kept on a stack, so each line is
+    pushed and popped at most once.
+
+    :note: The links are kept as the child_lines and parent_line of each line, rather than as line numbers, so they
+    stay right when lines are added or removed before them.
+
+    :param lines: The consecutive lines of a GEDCOM file, in order
+    :type lines: list of Line
+
+    """
+    stack = []
+    for position, line in enumerate(lines):
+        level = line["level"]
+        line.child_lines, line.parent_line = [], None
+        # Close every line that can no longer be a parent, the top is then the closest line with a lower level.
+        while stack and stack[-1][1]["level"] >= level:
+            stack.pop()
+        if stack:
+            parent_position, parent = stack[-1]
+            # Only lines on the same level as the first line after the parent are its children.
+            if lines[parent_position + 1]["level"] == level:
+                parent.child_lines.append(line)
+                line.parent_line = parent
+        stack.append((position, line))
+
+
+def is_record_start(gedcom_line_str):
+    """ Check if a GEDCOM line starts a new record, i.e. the line level is 0
+
+    :note: This only looks at the start of the line, so it is much cheaper than parsing the line.
+
+    :param gedcom_line_str: A GEDCOM line
+    :type gedcom_line_str: str
+
+    :rtype: bool
+
+    """
+    gedcom_line_str = gedcom_line_str.lstrip()
+    return gedcom_line_str[:1] == "0" and gedcom_line_str[1:2].isspace()
+
+
+def parse_chunk(chunk):
+    """ Parse a chunk of GEDCOM lines into line dictionaries
+
+    This is run in worker processes by File.read_file_parallel.
+
+    :param chunk: The line number of the first line, and the text of each line in the chunk
+    :type chunk: tuple of (int, list of str)
+
+    :return: The dictionary of each line and None; or None and the syntax error message of the first line that could
+    not be parsed.
+    :rtype: tuple
+
+    """
+    first_line_number, line_strings = chunk
+    lines = []
+    for i, line_string in enumerate(line_strings):
+        try:
+            lines.append(parse_line(line_string.strip()))
+        except SyntaxError as errorSyntax:
+            return None, "line number {0}: {1}".format(first_line_number + i, errorSyntax.msg)
+    return lines, None
+
+
+def iter_chunks(line_strings, chunk_lines=CHUNK_LINES):
+    """ Split GEDCOM lines into chunks of whole records
+
+    :param line_strings: The text of each non blank line
+    :type line_strings: iterable of str
+
+    :param chunk_lines: The number of lines after which a new chunk is started at the next record.
+    :type chunk_lines: int
+
+    :return: iterator of chunks for parse_chunk
+    :rtype: iterator of tuple of (int, list of str)
+
+    """
+    chunk, first_line_number = [], 0
+    for line in line_strings:
+        if len(chunk) >= chunk_lines and is_record_start(line):
+            yield first_line_number, chunk
+            first_line_number += len(chunk)
+            chunk = []
+        chunk.append(line)
+    if chunk:
+        yield first_line_number, chunk
+
+
+def iter_records(filename):
+    """ Read a GEDCOM file one record at a time
+
+    Each record is a level 0 line (INDI, FAM, HEAD...) together with all the lines below it. Only one record is
+    held in memory at a time, so this can be used on files that are too large to read with File.read_file.
+
+    :note: Each record is yielded as a File object, so it can be traversed and passed to story functions like any
+    other File. Line numbers are the line numbers in the whole file, but xref pointers can only be followed to lines
+    in the same record.
+
+    :param filename: A GEDCOM filename or file path.
+    :type filename: str
+
+    :return: iterator of records
+    :rtype: iterator of File
+
+    :Example:
+        for record in iter_records(filename):
+            print record[record.first_line_number].tag
+
+    """
+    with open(filename) as filehandle:
+        record_line_strings, first_line_number = [], 0
+        for line in ifilter(str.strip, filehandle):
+            if record_line_strings and is_record_start(line):
+                record = File()
+                record.read_lines(record_line_strings, first_line_number)
+                yield record
+                first_line_number += len(record_line_strings)
+                record_line_strings = []
+            record_line_strings.append(line)
+        if record_line_strings:
+            record = File()
+            record.read_lines(record_line_strings, first_line_number)
+            yield record
+
+
+class Record(object):
+    """GEDCOM Record Class
+
+    The lines of a record of a File (a level 0 line and all lines below it), in order. Every line of a File keeps its
+    record and its offset in the record, so the line number of a line is the line number of its record plus its
+    offset, see Line.line_number.
+
+    :note: When lines are added or removed, only the records that were edited are made again. The records after them
+    keep their lines and offsets, and only find their new position in the file the next time it is used, see
+    Record.position.
+
+    """
+
+    __slots__ = ("file", "lines", "previous", "start", "order")
+
+    def __init__(self, gedcom_file, start, previous):
+        """Initiate GEDCOM Record Class
+
+        :param gedcom_file: The File the record is part of
+        :type gedcom_file: File
+
+        :param start: The position of the first line of the record in the lines of the file
+        :type start: int
+
+        :param previous: The record before this one in the file, or None if this is the first record
+        :type previous: Record
+
+        """
+        self.file = gedcom_file
+        self.lines = []
+        self.previous = previous
+        self.start = start
+        # Records are compared by order to keep the lines of the indexes in file order, see File.index
+        self.order = 0
+
+    @property
+    def position(self):
+        """ The position of the first line of this record in the lines of its file
+
+        The position is only worked out again when lines were added or removed before the record since it was last
+        used, from the closest record before it whose position is still right.
+
+        :rtype: int
+
+        """
+        lines = self.file.lines
+        record, moved = self, []
+        while not (record.start < len(lines) and lines[record.start] is record.lines[0]):
+            moved.append(record)
+            record = record.previous
+            if record is None:
+                # The first record starts the file, unless the lines of the file were replaced since
+                if not lines or lines[0] is not moved[-1].lines[0]:
+                    return self.start
+                record = moved.pop()
+                record.start = 0
+                break
+        for moved_record in reversed(moved):
+            moved_record.start = record.start + len(record.lines)
+            record = moved_record
+        return self.start
+
+    @property
+    def line_number(self):
+        """ The line number of the first line of this record
+
+        :rtype: int
+
+        """
+        return self.file.first_line_number + self.position
+
+
 class File(object):
 
     """GEDCOM File Class
@@ -59,7 +350,172 @@ class File(object):
         """Initiate GEDCOM File Class
 
         """
+        # The number of times the derived data was thrown away, see tag.derived_property
+        self.derived_version = 0
         self.lines = []
+        # The line number of the first line. This is only not 0 for Files holding part of a GEDCOM file.
+        self.first_line_number = 0
+        # Dictionary of xref_ID to every line with that xref_ID, for xref_IDs found on more than one line.
+        self.duplicate_xrefs = {}
+
+    @property
+    def lines(self):
+        """ The list of lines in this file
+
+        :note: Setting the lines invalidates the indexes used by find and find_one.
+
+        """
+        return self.__lines
+
+    @lines.setter
+    def lines(self, lines):
+        self.__lines = lines
+        self.invalidate_indexes()
+        self.__clear_derived()
+
+    def __clear_derived(self):
+        """ Throw away everything derived from the lines, because the lines changed
+
+        Wrappers that are still held elsewhere forget their cached values, see tag.Base.invalidate.
+
+        """
+        for wrapper in getattr(self, "_File__wrappers", {}).itervalues():
+            wrapper.invalidate()
+        self.__wrappers = {}
+        self.__wrapper_classes = set()
+        self.__forget_derived()
+
+    def __forget_derived(self):
+        """ Throw away the derived datasets (see DERIVED), they are built again the next time they are used
+
+        The values wrappers worked out from them are forgotten too, see tag.derived_property.
+
+        """
+        self.__kinship = None
+        self.__ages = None
+        self.__names = None
+        self.__events = None
+        self.derived_version += 1
+
+    @property
+    def events(self):
+        """ The birth, death, marriage and divorce dates of the individuals and families in this file, read the first
+        time they are used
+
+        :rtype: events.EventTable
+
+        """
+        if self.__events is None:
+            self.__events = events.EventTable(self)
+        return self.__events
+
+    @property
+    def names(self):
+        """ The name index of the individuals in this file, built the first time it is used
+
+        :rtype: names.NameIndex
+
+        """
+        if self.__names is None:
+            self.__names = names.NameIndex(self)
+        return self.__names
+
+    @property
+    def ages(self):
+        """ The ages of the individuals and families in this file, computed the first time they are used
+
+        :rtype: ages.AgeTable
+
+        """
+        if self.__ages is None:
+            self.__ages = ages.AgeTable(self)
+        return self.__ages
+
+    @property
+    def kinship(self):
+        """ The kinship graph of the individuals and families in this file, built the first time it is used
+
+        :rtype: kinship.KinshipGraph
+
+        """
+        if self.__kinship is None:
+            self.__kinship = kinship.KinshipGraph(self)
+        return self.__kinship
+
+    @property
+    def ancestry(self):
+        """ The ancestry engine of the kinship graph of this file, built the first time it is used
+
+        :rtype: kinship.Ancestry
+
+        """
+        return self.kinship.ancestry
+
+    def prepare(self, *datasets):
+        """ Build derived datasets ahead of their first use, each after the datasets it is built from
+
+        Every dataset is built at most once, datasets that were already built are kept.
+
+        :param datasets: Names of derived datasets, the keys of DERIVED (e.g. "ages", "kinship")
+        :type datasets: str
+
+        :raises ValueError: if a name isn't a derived dataset
+
+        :return: The names of the datasets needed, in the order they were built
+        :rtype: list of str
+
+        :Example:
+            gedcom_file.prepare("ages", "names")  # builds kinship, ages and names
+
+        """
+        order, seen = [], set()
+
+        def visit(name):
+            if name in seen:
+                return
+            if name not in DERIVED:
+                raise ValueError("Unknown derived dataset '{0}'".format(name))
+            seen.add(name)
+            for dependency in DERIVED[name]:
+                visit(dependency)
+            order.append(name)
+
+        for name in datasets:
+            visit(name)
+        for name in order:
+            getattr(self, name)
+        return order
+
+    def wrap(self, wrapper_class, line):
+        """ Returns the wrapper_class object (e.g. tag.Individual) for a line of this file
+
+        The same object is returned every time for the same line and class, so values cached on the object (e.g. the
+        birth date of an individual) are only computed once.
+
+        :note: The registry is cleared when the lines are replaced, and the wrappers of the lines an edit changes are
+        removed from it, see __forget.
+
+        :param wrapper_class: A class of the tag module
+        :type wrapper_class: type
+
+        :param line: A line of this file
+        :type line: Line
+
+        """
+        key = (wrapper_class, id(line))
+        wrapper = self.__wrappers.get(key)
+        if wrapper is None:
+            wrapper = self.__wrappers[key] = wrapper_class(line)
+            self.__wrapper_classes.add(wrapper_class)
+        return wrapper
+
+    def invalidate_indexes(self):
+        """ Throw away the indexes used by find and find_one
+
+        :note: This must be called if lines are changed in place, the indexes are rebuilt the next time they are used.
+
+        """
+        self.__indexes = {}
 
     def __iter__(self):
         """ Return iterator for GEDCOM File Lines.
@@ -93,7 +549,7 @@ class File(object):
             print gedcom_file[4]
 
         """
-        return self.lines[line_number]
+        return self.lines[line_number - self.first_line_number]
 
     def __str__(self):
         """ Human representation of the class as a list of dictionaries.
@@ -119,25 +575,336 @@ class File(object):
 
         """
         filehandle = open(filename)
+        self.read_lines(filter(str.strip, filehandle))
+        # Close the file here because we no longer need to read from the file.
+        filehandle.close()
+
+    def read_file_parallel(self, filename, processes=None, chunk_lines=CHUNK_LINES):
+        """Method to read in file from filename or file path, parsing it in several processes
+
+        The file is split into chunks of whole records, each chunk is parsed by parse_chunk in a process pool, and
+        the parsed lines are put back together in order and linked. The result is the same as read_file.
+
+        :param filename: A GEDCOM filename or file path.
+        :type filename: str
+
+        :param processes: The number of worker processes, defaults to the number of CPUs.
+        :type processes: int
+
+        :param chunk_lines: The approximate number of lines given to a worker at a time.
+        :type chunk_lines: int
+
+        """
+        with open(filename) as filehandle:
+            chunks = list(iter_chunks(ifilter(str.strip, filehandle), chunk_lines))
+        pool = multiprocessing.Pool(processes)
+        try:
+            lines = []
+            for (first_line_number, line_strings), (line_dicts, error) in zip(chunks, pool.imap(parse_chunk, chunks)):
+                if error is not None:
+                    sys.exit(error)
+                lines.extend(Line(line_string, self, first_line_number + i, line_dict)
+                             for i, (line_string, line_dict) in enumerate(zip(line_strings, line_dicts)))
+        finally:
+            pool.terminate()
+            pool.join()
+        self.first_line_number = 0
+        self.lines = lines
+        self.__refresh()
+
+    def read_lines(self, line_strings, first_line_number=0):
+        """Method to read in the lines of a GEDCOM file
+
+            :param line_strings: The text of each non blank line
+            :type line_strings: iterable of str
+
+            :param first_line_number: The line number of the first line, used when reading part of a file.
+            :type first_line_number: int
+
+        """
+        self.first_line_number = first_line_number
         # Create a list of "Line" objects.
         # The text of the line, the instance of this class, and the line number are passed into each "Line" Object.
         # The instance of this class is passed in so that the line class can make calls to this class.
-        self.lines = [Line(line.strip(), self, i) for i, line in enumerate(filter(str.strip, filehandle))]
+        self.lines = [Line(line.strip(), self, first_line_number + i) for i, line in enumerate(line_strings)]
         # Refresh the file. Currently this determines which lines are parents and children of one another.
         self.__refresh()
-        # Close the file here because we no longer need to read from the file.
-        filehandle.close()
-    
+
     def __refresh(self):
         """ Refresh Each Line
 
-        Currently this determines which lines are parents and children of one another.
+        Currently this determines which lines are parents and children of one another, and groups the lines into
+        records.
 
-        :note: Currently this only needs to be called when the class is initiated, however
-        if we want to support adding and removing lines, this class will need to be called again.
+        :note: This only needs to be called when the lines are read. Adding and removing lines with insert_line,
+        remove_line and replace_record only refreshes the records that were edited.
+
+        :note: This is done in a single pass over the file using a stack of open lines, rather than having every
+        line scan the file for its own children and parent. The results are the same as calling Line.refresh on
+        every line.
+
+        """
+        link_lines(self.lines)
+        self.__make_records(0, len(self.lines))
+        self.__index_xrefs()
+
+    def __index_xrefs(self):
+        """ Build the dictionary used to look up lines by xref_ID
+
+        :note: GEDCOM xref_IDs should be unique. When they are not, the first line keeps being the one returned by
+        find_one and follow_xref, and every line sharing the xref_ID is recorded in self.duplicate_xrefs.
 
         """
-        [d.refresh() for d in self.lines]
+        self.invalidate_indexes()
+        index = self.index("xref_ID")
+        self.duplicate_xrefs = dict((xref, lines) for xref, lines in index.iteritems()
+                                    if xref is not None and len(lines) > 1)
+
+    def index(self, key):
+        """ Returns the index of the lines in this file for a key
+
+        The index is built the first time it is requested for a key, and kept until the lines change.
+
+        :param key: The key to index
+        :type key: str
+
+        :return: Dictionary of each value of the key to the lines with that value, in file order
+        :rtype: dict
+
+        :raises TypeError: if a value of the key can not be used in a dictionary (e.g. a list)
+
+        """
+        if key not in self.__indexes:
+            index = {}
+            for line in self.lines:
+                value = line.get(key)
+                if value in index:
+                    index[value].append(line)
+                else:
+                    index[value] = [line]
+            self.__indexes[key] = index
+        return self.__indexes[key]
+
+    def __matching_lines(self, key, value):
+        """ Returns the lines matching a key and value from the index, or None if the index can't be used
+
+        """
+        if len(self.lines) < INDEX_MIN_LINES:
+            return None
+        try:
+            return self.index(key).get(value, [])
+        except TypeError:
+            return None
+
+    def insert_line(self, line_number, line_string):
+        """ Insert a line into the file
+
+        :param line_number: The line number the new line will have, the line currently there and all lines after it
+        move down by one.
+        :type line_number: int
+
+        :param line_string: The string of the gedcom line
+        :type line_string: str
+
+        :return: The new line
+        :rtype: Line
+
+        """
+        self.__splice(line_number, line_number, [line_string])
+        return self[line_number]
+
+    def remove_line(self, line_number):
+        """ Remove a line from the file
+
+        :note: Only this line is removed, the lines below it are linked to a new parent if they have one.
+
+        :param line_number: The line number of the line to remove
+        :type line_number: int
+
+        :return: The removed line
+        :rtype: Line
+
+        """
+        line = self[line_number]
+        self.__splice(line_number, line_number + 1, [])
+        return line
+
+    def replace_record(self, line_number, line_strings):
+        """ Replace a record (a level 0 line and all lines below it) with new lines
+
+        :param line_number: The line number of the level 0 line of the record
+        :type line_number: int
+
+        :param line_strings: The strings of the new gedcom lines
+        :type line_strings: list of str
+
+        :return: The new lines, as a SubFile
+        :rtype: SubFile
+
+        :raises ValueError: if the line is not a level 0 line
+
+        """
+        line = self[line_number]
+        if line["level"] != 0:
+            raise ValueError("line number {0} does not start a record".format(line_number))
+        start = line_number - self.first_line_number
+        self.__splice(line_number, line_number + len(line.record.lines), line_strings)
+        return SubFile(self.lines[start:start + len(line_strings)])
+
+    def __splice(self, start_line_number, stop_line_number, line_strings):
+        """ Replace the lines from start_line_number up to (but not including) stop_line_number with new lines
+
+        Only the records containing the edit, and the record before it (whose last lines can gain or lose children),
+        are linked again and made into new records. The records after them keep their lines and offsets, their new
+        position is found the next time it is used (see Record.position). The indexes that have been built are
+        updated for the removed and new lines, and only the wrappers of the edited records, and of the records that
+        point to them, forget their cached values (see __forget).
+
+        :raises TypeError: if this is a SubFile, whose lines belong to another File
+        :raises IndexError: if a line number is out of range
+
+        """
+        if isinstance(self, SubFile):
+            raise TypeError("the lines of a SubFile belong to another File, edit that File instead")
+        lines = self.lines
+        start, stop = start_line_number - self.first_line_number, stop_line_number - self.first_line_number
+        if not 0 <= start <= stop <= len(lines):
+            raise IndexError("line number out of range")
+
+        # The edited records run from the record of the line before the edit to the end of the record of the line
+        # after it, unless that line starts a record of its own.
+        first = start - 1 - lines[start - 1].offset if start > 0 else 0
+        last = stop
+        if stop < len(lines) and lines[stop]["level"] != 0:
+            last = stop - lines[stop].offset + len(lines[stop].record.lines)
+        edited_lines, removed_lines = lines[first:last], lines[start:stop]
+        self.__update_indexes(removed_lines, [])
+        for i, line in enumerate(removed_lines):
+            # A removed line keeps the line number it had
+            line.record, line.offset = None, start_line_number + i
+
+        new_lines = [Line(line_string.strip(), self, start_line_number + i) for i, line_string in enumerate(line_strings)]
+        lines[start:stop] = new_lines
+        last += len(new_lines) - len(removed_lines)
+        link_lines(lines[first:last])
+        self.__make_records(first, last)
+        self.__update_indexes([], new_lines)
+        self.__forget(edited_lines + new_lines)
+
+    def __make_records(self, first, last):
+        """ Group the lines from position first up to last into new records, between the records around them
+
+        :note: The lines must be whole records, the line at first and the line at last (if there is one) start a
+        record.
+
+        """
+        lines = self.lines
+        record = lines[first - 1].record if first > 0 else None
+        records = []
+        for position in xrange(first, last):
+            line = lines[position]
+            if line["level"] == 0 or not records:
+                record = Record(self, position, record)
+                records.append(record)
+                record_lines, start = record.lines, position
+            line.record, line.offset = record, position - start
+            record_lines.append(line)
+        if last < len(lines):
+            lines[last].record.previous = record
+        self.__order_records(records, first, last)
+
+    def __order_records(self, records, first, last):
+        """ Give new records orders between the orders of the records around them, see Record.order
+
+        :note: If there is no room left between the orders of the records around them, the records after them are
+        given new orders too, up to the first record that leaves enough room.
+
+        """
+        if not records:
+            return
+        lines = self.lines
+        low = lines[first - 1].record.order if first > 0 else None
+        position, following = last, []
+        while position < len(lines) and low is not None:
+            record = lines[position].record
+            if (record.order - low) // (len(records) + len(following) + 1) > 0:
+                break
+            record.start = position
+            following.append(record)
+            position += len(record.lines)
+        ordered = records + following
+        if position < len(lines):
+            high = lines[position].record.order
+            if low is None:
+                low = high - (len(ordered) + 1) * ORDER_GAP
+            step = (high - low) // (len(ordered) + 1)
+        else:
+            low, step = low if low is not None else -ORDER_GAP, ORDER_GAP
+        for i, record in enumerate(ordered):
+            record.order = low + (i + 1) * step
+
+    @staticmethod
+    def __order_position(lines, line):
+        """ Returns where a line is, or would go, in a list of lines in file order, see Record.order """
+        order = (line.record.order, line.offset)
+        low, high = 0, len(lines)
+        while low < high:
+            middle = (low + high) // 2
+            other = lines[middle]
+            if (other.record.order, other.offset) < order:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __update_indexes(self, removed_lines, new_lines):
+        """ Remove lines from, and add lines to, the indexes that have been built
+
+        """
+        for key in self.__indexes.keys():
+            index = self.__indexes[key]
+            # Indexes of keys that depend on line positions can't be updated for only the edited lines.
+            if key in ("line_number", "children_line_numbers", "parent_line_numbers"):
+                del self.__indexes[key]
+                continue
+            try:
+                for line in removed_lines:
+                    matching_lines = index[line.get(key)]
+                    del matching_lines[self.__order_position(matching_lines, line)]
+                    if not matching_lines:
+                        del index[line.get(key)]
+                for line in new_lines:
+                    matching_lines = index.setdefault(line.get(key), [])
+                    matching_lines.insert(self.__order_position(matching_lines, line), line)
+            except TypeError:
+                del self.__indexes[key]
+        for xref in set(line.get("xref_ID") for line in removed_lines + new_lines) - {None}:
+            with_xref = self.index("xref_ID").get(xref, [])
+            if len(with_xref) > 1:
+                self.duplicate_xrefs[xref] = with_xref
+            else:
+                self.duplicate_xrefs.pop(xref, None)
+
+    def __forget(self, lines):
+        """ Remove the wrappers of the lines an edit changed from the registry, and throw away the derived datasets
+
+        The wrappers forget their cached values, see tag.Base.invalidate. The wrappers of the records that point to
+        an xref of the lines are removed too, e.g. the Family of a HUSB line pointing to an edited individual, because
+        they cache values read through the pointer.
+
+        """
+        if self.__wrappers:
+            xrefs = set(line["xref_ID"] for line in lines) - {None}
+            forgotten = list(lines)
+            for xref in xrefs:
+                for line in self.index("line_value").get(xref, []):
+                    forgotten.extend(line.record.lines)
+            for line in forgotten:
+                for wrapper_class in self.__wrapper_classes:
+                    wrapper = self.__wrappers.pop((wrapper_class, id(line)), None)
+                    if wrapper is not None:
+                        wrapper.invalidate()
+        self.__forget_derived()
 
     def find(self, key, value):
         """ Finds aLL lines in file that have a matching key and value
@@ -159,8 +926,15 @@ class File(object):
             print g.find('tag', 'HUSB')
             print g.find('tag', 'a_value_that_will_never_be_found')
 
+        :note: Lines are found through the index for the key, see File.index
+
         """
-        list_of_matching_lines = filter(lambda d: d.get(key) == value, self.lines)
+        list_of_matching_lines = self.__matching_lines(key, value)
+        if list_of_matching_lines is None:
+            list_of_matching_lines = filter(lambda d: d.get(key) == value, self.lines)
+        else:
+            # Copy the list so the SubFile can't change the index.
+            list_of_matching_lines = list(list_of_matching_lines)
         # Return a SubFile object so that the returned object can continue to use methods defined in the File class
         return SubFile(list_of_matching_lines)
 
@@ -182,7 +956,12 @@ class File(object):
             print g.find_one('tag', 'HUSB')
             print g.find_one('tag', 'a_value_that_will_never_be_found')
 
+        :note: Lines are found through the index for the key, see File.index
+
         """
+        list_of_matching_lines = self.__matching_lines(key, value)
+        if list_of_matching_lines is not None:
+            return list_of_matching_lines[0] if list_of_matching_lines else None
         return next(ifilter(lambda d: d.get(key) == value, self.lines), None)
 
     @property
@@ -209,19 +988,19 @@ class File(object):
             print gedcom_file.json
 
         """
-        return json.dumps(self.lines, sort_keys=True, indent=4, separators=(',', ': '))
+        return json.dumps([line.as_dict() for line in self.lines], sort_keys=True, indent=4, separators=(',', ': '))
 
     @property
     def individuals(self):
-        return [tag.Individual(line) for line in self.find("tag", "INDI")]
+        return [self.wrap(tag.Individual, line) for line in self.find("tag", "INDI")]
 
     @property
     def families(self):
-        return [tag.Family(line) for line in self.find("tag", "FAM")]
+        return [self.wrap(tag.Family, line) for line in self.find("tag", "FAM")]
 
     @property
     def dates(self):
-        return [tag.Date(line) for line in self.find("tag", "DATE")]
+        return [self.wrap(tag.Date, line) for line in self.find("tag", "DATE")]
 
 
 class SubFile(File):
@@ -257,7 +1036,20 @@ class SubFile(File):
         this is due to the line objects having access the the rest of the file, and their line numbers updated.
 
         """
-        self.lines = lines
+        # The lines are set directly rather than through File.lines, a new SubFile has no indexes or derived data to
+        # throw away, and many short lived SubFiles are made by Line.children and File.find.
+        self._File__lines = lines
+        self._File__indexes = {}
+        self._File__wrappers = {}
+        self._File__wrapper_classes = set()
+        self.derived_version = 0
+        self._File__kinship = None
+        self._File__ages = None
+        self._File__names = None
+        self._File__events = None
+        # The lines of a SubFile aren't a contiguous part of the file, so they are indexed by position.
+        self.first_line_number = 0
+        self.duplicate_xrefs = {}
 
 
 class Line(dict):
@@ -266,9 +1058,14 @@ class Line(dict):
     This class is a subclass of dict. This class was made to give extra features to dictionaries to make them more
     suitable for representing GEDCOM Lines.
 
+    :note: The "line_number", "children_line_numbers" and "parent_line_numbers" values are not stored in the
+    dictionary, they are worked out from the record of the line and its links when they are used, so they stay right
+    when lines are added or removed before them. They can be read with line[key] and line.get(key) like the other
+    values, and are included in as_dict, repr and File.json.
+
     """
 
-    def __init__(self, line_string, file_class, line_number):
+    def __init__(self, line_string, file_class, line_number, line_dict=None):
         """Initiate GEDCOM Line Class
 
         :param line_string: The string of the gedcom line
@@ -284,10 +1081,22 @@ class Line(dict):
         :note file_class: Specifying line number on initiation is more useful than having to continually check where
         a line is located in a list.
 
+        :param line_dict: The dictionary of this line if it was already parsed, see parse_chunk
+        :type line_dict: dict
+        :note line_dict: The line string is not parsed again.
+
         """
         self.file = file_class
         # Set the private variable __text to the string provided, stripped of white space.
         self.__text = line_string.strip()
+        # The record of the line and its offset in the record are set when the File groups its lines into records.
+        # Until then the line has no record, and the offset is its line number.
+        self.record, self.offset = None, line_number
+        # The children and parent of this line. These will be updated if this object was generated by the File class
+        self.child_lines, self.parent_line = [], None
+        if line_dict is not None:
+            self.update(line_dict)
+            return
         # Set the update the dictionary object key values based on the string provided
         # This is a benefit of using a subclass because the user doesn't have to pass in
         # a dictionary
@@ -296,12 +1105,56 @@ class Line(dict):
         except SyntaxError as errorSyntax:
             sys.exit("line number {0}: {1}".format(line_number, errorSyntax.msg))
 
-        # Add line number to the dictionary. This is more useful on continuously checking
-        # where this object is in a list of Line objects
-        self.update({"line_number": line_number})
-        # Add empty children_line_numbers and parent_line_number keys to this dictionary.
-        # This will be updated if this object was generated by the File class
-        self.update({"children_line_numbers": [], "parent_line_numbers": []})
+    def __missing__(self, key):
+        """ Returns the values that are worked out when they are used, see the note of the class """
+        if key == "line_number":
+            return self.line_number
+        if key == "children_line_numbers":
+            return [line.line_number for line in self.child_lines]
+        if key == "parent_line_numbers":
+            return [self.parent_line.line_number] if self.parent_line is not None else []
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        """ Returns a value of the line by its key, or default if the line has no such value """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def as_dict(self):
+        """ Returns the line as a dictionary, with the values that are worked out when they are used
+
+        :rtype: dict
+
+        """
+        line_dict = dict(self)
+        for key in ("line_number", "children_line_numbers", "parent_line_numbers"):
+            line_dict[key] = self[key]
+        return line_dict
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+    def __eq__(self, other):
+        if isinstance(other, Line):
+            return dict.__eq__(self, other) and self.line_number == other.line_number
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def line_number(self):
+        """ The line number of this line, from the line number of its record (see Record.line_number)
+
+        :rtype: int
+
+        """
+        record = self.record
+        if record is None:
+            return self.offset
+        return record.line_number + self.offset
 
     @property
     def text(self):
@@ -323,8 +1176,8 @@ class Line(dict):
     def children(self):
         """ Returns a list of GEDCOM lines objects that are children of this line.
 
-        :note: This class makes use of the 'children_line_numbers' value in this
-        class that was updated when the GEDCOM File Class was initiated
+        :note: This class makes use of the child_lines of this line, that were linked when the GEDCOM File Class was
+        initiated
 
         :return: A list of matched lines, as a SubFile
         :rtype: SubFile
@@ -334,15 +1187,15 @@ class Line(dict):
 
         """
         if self.file:
-            return SubFile(map(self.file.lines.__getitem__, self.get('children_line_numbers', [])))
+            return SubFile(list(self.child_lines))
         return None
 
     @property
     def parent(self):
         """Returns the parent line of this line
 
-        :note: This class makes use of the 'parent_line_numbers' value in this
-        class that was updated when the GEDCOM File Class was initiated
+        :note: This class makes use of the parent_line of this line, that was linked when the GEDCOM File Class was
+        initiated
 
         :return: The Line object of the parent line
         :rtype: Line
@@ -352,7 +1205,7 @@ class Line(dict):
         :note: This method will return None if line has no parent, i.e. the line level is 0.
 
         """
-        return next(imap(self.file.lines.__getitem__, self.get('parent_line_numbers', [])), None)
+        return self.parent_line
 
     def refresh(self):
         """ Refresh this line
@@ -364,10 +1217,10 @@ class Line(dict):
         The calling of this method is handled by the File class once all Line ojects are created.
 
         """
-        # Refresh Children Line Numbers.
-        self.update({"children_line_numbers": self.__find_children_line_numbers()})
-        # Refresh Parent Line Numbers.
-        self.update({"parent_line_numbers": self.__find_parent_line_numbers()})
+        # Refresh Children Lines.
+        self.child_lines = map(self.file.__getitem__, self.__find_children_line_numbers())
+        # Refresh Parent Line.
+        self.parent_line = next(imap(self.file.__getitem__, self.__find_parent_line_numbers()), None)
 
     def __find_children_line_numbers(self):
         """ Determine the line numbers of the children of this line.
@@ -424,6 +1277,8 @@ class Line(dict):
     def follow_xref(self):
         """ Search file lines with an xref_id equal to this lines line_value
 
+        :note: If more than one line has the xref_id, the first one is returned. See File.duplicate_xrefs
+
         :returns: matching line
         :rtype: GEDCOM Line
         """
@@ -434,7 +1289,7 @@ class Line(dict):
         """ Line Number Property
         :return: line number
         """
-        return self.get("line_number")+1
+        return self.line_number + 1
 
     @property
     def tag(self):
@@ -518,4 +1373,27 @@ def demo(gedcom_file):
 
 
 if __name__ == "__main__":
-    pass
+    # Check indexing a file, the children of a line and the lines found, run from the project directory
+    check_file = File()
+    check_file.read_file("Test_Files/GEDCOM.ged")
+    assert check_file[5] is check_file.lines[5]
+    children = check_file[0].children
+    assert all(children[i] is children.lines[i] for i in range(len(children.lines)))
+    found = check_file.find("tag", "HUSB")
+    assert len(found.lines) > 1 and all(found[i] is found.lines[i] for i in range(len(found.lines)))
+    assert found[1].parent["tag"] == "FAM"
+    # Check a SubFile can wrap its lines and build derived data like a File
+    found = check_file.find("tag", "INDI")
+    assert [i.line for i in found.individuals] == found.lines and found.individuals[0] is found.individuals[0]
+    assert len(found.names.full) == len(found.lines) and found.events is found.events
+    # Check an edit moves the lines after it, and keeps the links and the indexes
+    husband = check_file.find("tag", "HUSB")[1]
+    line_number, family, last = husband["line_number"], husband.parent, check_file.lines[-1]
+    note = check_file.insert_line(line_number, "1 NOTE edited")
+    assert husband["line_number"] == line_number + 1 and last["line_number"] == len(check_file.lines) - 1
+    assert note.parent is family and {line_number, line_number + 1} <= set(family["children_line_numbers"])
+    assert any(line is note for line in check_file.find("tag", "NOTE"))
+    assert check_file.remove_line(line_number) is note and husband["line_number"] == line_number
+    assert last["line_number"] == len(check_file.lines) - 1
+    assert not any(line is note for line in check_file.find("tag", "NOTE"))
+    print "ok"
@@ -1,4 +1,7 @@
-import re
+import copy
+import types
+import kinship
+import names
 import tools
 import parser
 from datetime import datetime
@@ -7,14 +10,151 @@ NOW = datetime.now()
 NOW_STRING = NOW.strftime("%d %b %Y").upper()
 
 
-def cachemethod(func):
-    def wrapper(self, *args):
-        if func.__name__ in self.cache:
-            return self.cache.get(func.__name__)
-        val = func(self, *args)
-        self.cache[func.__name__] = val
-        return val
-    return wrapper
+_cache_limit = None
+_evictions = [0]
+
+
+class cached_property(object):
+    """ Property whose value is computed the first time it is used, and kept in the cache dict of the object
+
+    The cache dict is the only attribute used, so objects with __slots__ are supported as long as "cache" is one of
+    them. Values can be forgotten with Base.invalidate, which File does for the wrappers of the records an edit
+    changes, or by limit_cache. A generator is turned into a list before it is kept, so it can be iterated more than
+    once.
+
+    :note: hits and misses count the uses of the property that did, and did not, find a cached value.
+
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self.hits = 0
+        self.misses = 0
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        cache = instance.cache
+        try:
+            value = cache[self.name]
+        except KeyError:
+            self.misses += 1
+            value = self.func(instance)
+            if isinstance(value, types.GeneratorType):
+                value = list(value)
+            cache[self.name] = value
+        else:
+            self.hits += 1
+        if _cache_limit is not None:
+            _cache_limit[(id(cache), self.name)] = cache
+        return value
+
+    def __set__(self, instance, value):
+        raise AttributeError("can't set attribute")
+
+
+class derived_property(cached_property):
+    """ Cached property whose value depends on more than the lines of its object, e.g. on the kinship graph of the
+    file or on line numbers, which move when lines are added or removed before them
+
+    The value is computed again once the file has been edited, see parser.File.derived_version.
+
+    """
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            version = instance.line.file.derived_version
+        except AttributeError:
+            version = None
+        cache = instance.cache
+        cached = cache.get(self.name)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            value = cached[1]
+        else:
+            self.misses += 1
+            value = self.func(instance)
+            if isinstance(value, types.GeneratorType):
+                value = list(value)
+            cache[self.name] = (version, value)
+        if _cache_limit is not None:
+            _cache_limit[(id(cache), self.name)] = cache
+        return value
+
+
+def _evict(key, cache):
+    _evictions[0] += 1
+    cache.pop(key[1], None)
+
+
+def limit_cache(size):
+    """ Keep at most size cached property values across all objects, forgetting the least recently used ones
+
+    This bounds the memory used by the cached properties of very large files.
+
+    :param size: The largest number of cached values, or None for no limit (the default)
+    :type size: int or None
+
+    """
+    global _cache_limit
+    _cache_limit = tools.LRUCache(size, on_evict=_evict) if size is not None else None
+
+
+def cache_info():
+    """ Returns the hits and misses of each cached property, and the totals
+
+    :Example:
+        print cache_info()["properties"]["Individual.birth_date"]  # (hits, misses)
+
+    :rtype: dict
+
+    """
+    properties = {}
+    for cls in (Base, Sex, Name, Date, Individual, Family):
+        for name, value in vars(cls).items():
+            if isinstance(value, cached_property):
+                properties["{0}.{1}".format(cls.__name__, name)] = (value.hits, value.misses)
+    return {"hits": sum(h for h, m in properties.values()),
+            "misses": sum(m for h, m in properties.values()),
+            "evictions": _evictions[0],
+            "size": len(_cache_limit) if _cache_limit is not None else None,
+            "properties": properties}
+
+
+def reset_cache_info():
+    """ Set every hit, miss and eviction count back to zero """
+    for cls in (Base, Sex, Name, Date, Individual, Family):
+        for value in vars(cls).values():
+            if isinstance(value, cached_property):
+                value.hits = value.misses = 0
+    _evictions[0] = 0
+
+
+def wrap(cls, line):
+    """ Returns the cls object (e.g. Individual) for a line
+
+    The object is shared through the registry of the File the line belongs to, so the values cached on it are only
+    computed once. See parser.File.wrap
+
+    """
+    if line is None:
+        return cls(line)
+    return line.file.wrap(cls, line)
+
+
+def wrap_date(line):
+    """ Returns the Date of a DATE line, or None if its value isn't a legitimate date (see Date.legitimate)
+
+    Dates that aren't legitimate are reported by US42, and are missing everywhere else, e.g. the birth date of an
+    individual with "2 DATE 30 FEB 1992" is None.
+
+    """
+    date = wrap(Date, line)
+    return date if date.legitimate else None
 
 
 class Base(object):
@@ -22,30 +162,35 @@ class Base(object):
         self.line = line
         self.cache = {}
 
-    @property
-    @cachemethod
+    @derived_property
     def ln(self):
         try:
             return self.line.ln
         except AttributeError:
             return None
 
-    @property
-    @cachemethod
+    @cached_property
     def val(self):
         try:
             return self.line.val
         except AttributeError:
             return None
 
-    @property
-    @cachemethod
+    @derived_property
     def story_dict(self):
         try:
             return self.line.story_dict
         except AttributeError:
             return None
 
+    def invalidate(self, *names):
+        """ Forget the cached values of some properties, or of every property if no names are given """
+        if names:
+            for name in names:
+                self.cache.pop(name, None)
+        else:
+            self.cache.clear()
+
     def has(self, p):
         return (getattr(self, p) is not None) and (getattr(self, p) is not {})
 
@@ -71,61 +216,130 @@ class Name(Base):
         return str(self) != str(other)
 
 
-    @property
-    @cachemethod
+    @cached_property
     def surname(self):
-        m = re.match(r".*?/([^/]*)/", self.val)
-        return m.group(1).strip() if m else None
+        return names.split_name(self.val)[1]
+
+
+class _Missing(object):
+    """ Comparison key of a date compared with a missing date, a missing date is only equal to another missing date
+    and is never before or after a date
+    """
+
+    def __init__(self, missing):
+        self.missing = missing
+
+    def __eq__(self, other):
+        return self.missing and other.missing
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return False
+
+    __le__ = __ge__ = __eq__
 
 
 class Date(Base):
     def __str__(self):
         return "{0} (line {1})".format(self.val, self.ln)
 
+    # Dates are compared by the YYYYMMDD of their packed integers, which orders them like their datetimes. A missing
+    # date (no line, no value, or a value that isn't a legitimate date, see US42) is not before, after or equal to any
+    # date, only equal to another missing date.
+
     def __eq__(self, other):
-        return self.dt == other.dt
+        a, b = self.__keys(other)
+        return a == b
 
     def __ne__(self, other):
-        return self.dt != other.dt
+        a, b = self.__keys(other)
+        return a != b
 
     def __lt__(self, other):
-        return self.dt < other.dt
+        a, b = self.__keys(other)
+        return a < b
 
     def __gt__(self, other):
-        return self.dt > other.dt
+        a, b = self.__keys(other)
+        return a > b
 
     def __le__(self, other):
-        return self.dt <= other.dt
+        a, b = self.__keys(other)
+        return a <= b
 
     def __ge__(self, other):
-        return self.dt >= other.dt
+        a, b = self.__keys(other)
+        return a >= b
 
-    @property
-    @cachemethod
+    def __keys(self, other):
+        a, b = self.packed, other.packed
+        if a is None or b is None:
+            return _Missing(a is None), _Missing(b is None)
+        return a >> 2, b >> 2
+
+    @cached_property
     def dt(self):
+        """ The date as a datetime, or None if there is no date or it isn't legitimate (see legitimate) """
         try:
             return self.line.datetime
+        except (AttributeError, ValueError):
+            return None
+
+    @cached_property
+    def packed(self):
+        """ The date as a packed integer, see tools.pack_date
+
+        :return: packed date, or None if there is no date, or the value isn't a supported date format or a legitimate
+        date (see legitimate)
+
+        """
+        try:
+            value = self.line.get("line_value") if self.line.tag == "DATE" else None
         except AttributeError:
             return None
+        try:
+            return tools.pack_date(value) if isinstance(value, basestring) else None
+        except ValueError:
+            return None
 
     @property
-    @cachemethod
+    def precision(self):
+        """ tools.PRECISION_DAY, PRECISION_MONTH or PRECISION_YEAR, or None if there is no date """
+        return tools.unpack_date(self.packed)[1] if self.packed is not None else None
+
+    @property
+    def is_partial(self):
+        """ True if the date has no day, or no day and month (e.g. "JAN 2000" or "2000") """
+        return self.precision in (tools.PRECISION_MONTH, tools.PRECISION_YEAR)
+
+    @cached_property
+    def legitimate(self):
+        """ False if the date line has no value, the value isn't a supported date format, or isn't a legitimate date
+        (e.g. 30 FEB 2015)
+        """
+        return self.line is None or self.packed is not None
+
+    @cached_property
     def type(self):
         options = {"HEAD": "header", "MARR": "marriage", "DIV": "divorce", "BIRT": "birth", "DEAT": "death"}
         p = self.line.parent
         return options.get(p.tag, p.tag) if p is not None else None
 
-    @property
-    @cachemethod
+    @cached_property
     def belongs_to(self):
         p = self.line.parent
         if p:
             pp = p.parent
             if pp:
                 if pp.tag == "INDI":
-                    return Individual(pp)
+                    return wrap(Individual, pp)
                 if pp.tag == "FAM":
-                    return Family(pp)
+                    return wrap(Family, pp)
 
 
 class Individual(Base):
@@ -143,37 +357,34 @@ class Individual(Base):
     def __ne__(self, other):
         return self.xref != other.xref
 
-    @property
-    @cachemethod
+    @derived_property
     def story_dict(self):
         return {"xref": self.xref, "line_number": self.ln}
 
-    @property
-    @cachemethod
+    @cached_property
     def xref(self):
         return self.line.get('xref_ID')
 
-    @property
-    @cachemethod
+    @cached_property
     def name(self):
-        return Name(self.line.children.find_one("tag", "NAME"))
+        return wrap(Name, self.line.children.find_one("tag", "NAME"))
 
-    @property
-    @cachemethod
+    @cached_property
     def sex(self):
-        return Sex(self.line.children.find_one("tag", "SEX"))
+        return wrap(Sex, self.line.children.find_one("tag", "SEX"))
 
-    @property
-    @cachemethod
+    @cached_property
     def age(self):
-        if self.birth_date:
-            if self.death_date:
-                return tools.years_between(self.birth_date.dt, self.death_date.dt)
-            return tools.years_between(self.birth_date.dt, NOW)
+        # Dates that aren't legitimate are missing, the same as in ages.AgeTable
+        birth = self.birth_date.dt if self.birth_date else None
+        if birth is not None:
+            death = self.death_date.dt if self.death_date else None
+            if death is not None:
+                return tools.years_between(birth, death)
+            return tools.years_between(birth, NOW)
         return None
 
-    @property
-    @cachemethod
+    @cached_property
     def pronoun(self):
         sex = self.sex.val if self.has("sex") else None
         if sex == "M":
@@ -182,8 +393,7 @@ class Individual(Base):
             return "her"
         return "their"
 
-    @property
-    @cachemethod
+    @cached_property
     def niece_or_nephew(self):
         sex = self.sex.val if self.has("sex") else None
         if sex == "M":
@@ -192,8 +402,7 @@ class Individual(Base):
             return "niece"
         return "niece/nephew"
 
-    @property
-    @cachemethod
+    @cached_property
     def aunt_or_uncle(self):
         sex = self.sex.val if self.has("sex") else None
         if sex == "M":
@@ -202,32 +411,28 @@ class Individual(Base):
             return "aunt"
         return "niece/nephew"
 
-    @property
-    @cachemethod
+    @cached_property
     def birth(self):
         return self.line.children.find_one("tag", "BIRT")
 
-    @property
-    @cachemethod
+    @cached_property
     def birth_date(self):
         if type(self.birth) is parser.Line:
             date = self.birth.children.find_one('tag', 'DATE')
             if type(date) is parser.Line:
-                return Date(date)
+                return wrap_date(date)
 
-    @property
-    @cachemethod
+    @cached_property
     def death(self):
         l = self.line.children.find_one("tag", "DEAT")
         return l if type(l) is parser.Line else None
 
-    @property
-    @cachemethod
+    @cached_property
     def death_date(self):
         if type(self.death) is parser.Line:
             date = self.death.children.find_one('tag', 'DATE')
             if type(date) is parser.Line:
-                return Date(date)
+                return wrap_date(date)
 
     def families(self, tag):
         """ Returns iterator of families where this person is a spouse.
@@ -236,19 +441,23 @@ class Individual(Base):
         """
         if tag not in ["FAMS", "FAMC"]:
             raise ValueError("families tag must be 'FAMS' or 'FAMC'")
-        return iter(Family(f.follow_xref()) for f in self.line.children.find("tag", tag))
+        return iter(wrap(Family, f.follow_xref()) for f in self.line.children.find("tag", tag))
 
     @property
     def spouses(self):
-        """
+        """ Yields the spouses of this individual, each with the family they are a spouse in as spouse_family
+
+        Note: The spouses are copies of the shared Individual objects, because spouse_family depends on the marriage.
         """
         for fam in self.families("FAMS"):
             if fam.has("husband") and fam.husband.xref != self.xref:
-                fam.husband.spouse_family = fam
-                yield fam.husband
+                husband = copy.copy(fam.husband)
+                husband.spouse_family = fam
+                yield husband
             if fam.has("wife") and fam.wife.xref != self.xref:
-                fam.wife.spouse_family = fam
-                yield fam.wife
+                wife = copy.copy(fam.wife)
+                wife.spouse_family = fam
+                yield wife
 
     @property
     def families_and_spouses(self):
@@ -260,8 +469,7 @@ class Individual(Base):
             if fam.has("wife") and fam.wife.xref != self.xref:
                 yield fam, fam.wife
 
-    @property
-    @cachemethod
+    @derived_property
     def summary(self):
         """ Returns the summary for individual
         """
@@ -270,77 +478,82 @@ class Individual(Base):
                            "sex": self.sex.story_dict if self.has("sex") else None,
                            "birth_date": self.birth_date.story_dict if self.has("birth_date") else None}
 
-    @property
-    @cachemethod
+    @derived_property
+    def kinship_index(self):
+        """ Returns the index of this individual in the kinship graph of its file, see kinship.KinshipGraph """
+        return self.line.file.kinship.index(self.line)
+
+    def _kin(self, relationship):
+        """ Returns the result of a KinshipGraph method for this individual, or an empty list if not in the graph """
+        i = self.kinship_index
+        return getattr(self.line.file.kinship, relationship)(i) if i is not None else []
+
+    def _individual(self, i):
+        return wrap(Individual, self.line.file.kinship.individuals[i])
+
+    def _family(self, f):
+        return wrap(Family, self.line.file.kinship.families[f])
+
+    @derived_property
     def siblings(self):
-        for fam in self.families("FAMC"):
-            for child in fam.children:
-                if self != child:
-                    yield child
+        return [self._individual(s) for f, s in self._kin("siblings")]
 
-    @property
-    @cachemethod
+    @derived_property
     def aunts_and_uncles(self):
-        for fam in self.families("FAMC"):
-            for sib in fam.husband.siblings:
-                sib.rel_by = fam.husband
-                sib.rel_by_type = "dad"
-                yield sib
-            for sib in fam.wife.siblings:
-                sib.rel_by = fam.wife
-                sib.rel_by_type = "mom"
-                yield sib
-
-    @property
-    @cachemethod
+        """ Note: The aunts and uncles are copies of the shared Individual objects, with the parent they are related
+        by as rel_by and rel_by_type.
+        """
+        r = []
+        for role, p, s in self._kin("aunts_and_uncles"):
+            sib = copy.copy(self._individual(s))
+            sib.rel_by = self._individual(p)
+            sib.rel_by_type = "dad" if role == "HUSB" else "mom"
+            r.append(sib)
+        return r
+
+    @derived_property
     def cousins(self):
-        for fam in self.families("FAMC"):
-            for sib in fam.husband.siblings:
-                for child in sib.children:
-                    yield child
-            for sib in fam.wife.siblings:
-                for child in sib.children:
-                    yield child
+        return [self._individual(c) for c in self._kin("cousins")]
 
-    @property
-    @cachemethod
+    @derived_property
     def families_and_siblings(self):
-        for fam in self.families("FAMC"):
-            for child in fam.children:
-                if self != child:
-                    yield fam, child
+        return [(self._family(f), self._individual(s)) for f, s in self._kin("siblings")]
 
-    @property
-    @cachemethod
+    @derived_property
     def families_and_children(self):
-        for fam in self.families("FAMS"):
-            for child in fam.children:
-                yield fam, child
+        graph, i = self.line.file.kinship, self.kinship_index
+        if i is None:
+            return []
+        return [(self._family(f), self._individual(c)) for f in graph.spouse_in[i] for c in graph.family_children[f]]
 
-    @property
-    @cachemethod
+    @derived_property
     def children(self):
-        return [c for f in self.families("FAMS") for c in f.children]
+        i = self.kinship_index
+        return [self._individual(c) for c in self.line.file.kinship.children[i]] if i is not None else []
 
-    @property
-    @cachemethod
+    @derived_property
     def descendants(self):
+        """ Returns the descendants of this individual a generation at a time, see kinship.Ancestry.descendants
 
-        title = lambda i: "child" if i == 1 else "grandchild" if i == 2 else (i-2)*"great-"+"grandchild"
-
-        def get_d(individuals=[], checked=[], i=1):
-            new = []
-            for indi in individuals:
-                for child in indi.children:
-                    if child in checked:
-                        pass
-                    else:
-                        child.descendant_title = title(i)
-                        checked.append(child)
-                        new.append(child)
-            return new + get_d(new, checked, i+1) if len(new) > 0 else new
-
-        return get_d([self])
+        Note: The descendants are copies of the shared Individual objects, with their title (e.g. "grandchild") as
+        descendant_title, because the title depends on whose descendant it is.
+        """
+        i = self.kinship_index
+        if i is None:
+            return []
+        r = []
+        for d, generation in self.line.file.kinship.ancestry.descendants(i):
+            descendant = copy.copy(self._individual(d))
+            descendant.descendant_title = kinship.generation_title(generation)
+            r.append(descendant)
+        return r
+
+    def is_ancestor_of(self, other):
+        """ Returns True if this individual is an ancestor of another, see kinship.Ancestry.is_ancestor """
+        i, j = self.kinship_index, other.kinship_index
+        if i is None or j is None:
+            return False
+        return self.line.file.kinship.ancestry.is_ancestor(i, j)
 
 
 class Family(Base):
@@ -350,62 +563,51 @@ class Family(Base):
     def __eq__(self, other):
         return self.xref == other.xref
 
-    @property
-    @cachemethod
+    @cached_property
     def xref(self):
         return self.line.get('xref_ID')
 
-    @property
-    @cachemethod
+    @derived_property
     def story_dict(self):
         return {"xref": self.xref, "line_number": self.ln}
 
-    @property
-    @cachemethod
+    @cached_property
     def husband(self):
         husb = self.line.children.find_one('tag', 'HUSB')
-        return Individual(husb.follow_xref()) if husb else None
+        return wrap(Individual, husb.follow_xref()) if husb else None
 
-    @property
-    @cachemethod
+    @cached_property
     def husband_marriage_age(self):
         return tools.years_between(self.marriage_date.dt, self.husband.birth_date.dt)
 
-    @property
-    @cachemethod
+    @cached_property
     def wife(self):
         wife = self.line.children.find_one('tag', 'WIFE')
-        return Individual(wife.follow_xref()) if wife else None
+        return wrap(Individual, wife.follow_xref()) if wife else None
 
-    @property
-    @cachemethod
+    @cached_property
     def wife_marriage_age(self):
         return tools.years_between(self.marriage_date.dt, self.wife.birth_date.dt)
 
-    @property
-    @cachemethod
+    @cached_property
     def marriage(self):
         return self.line.children.find_one('tag', 'MARR')
 
-    @property
-    @cachemethod
+    @cached_property
     def marriage_date(self):
         marr = self.marriage
-        return Date(marr.children.find_one('tag', 'DATE')) if marr else None
+        return wrap_date(marr.children.find_one('tag', 'DATE')) if marr else None
 
-    @property
-    @cachemethod
+    @cached_property
     def divorce(self):
         return self.line.children.find_one('tag', 'DIV')
 
-    @property
-    @cachemethod
+    @cached_property
     def divorce_date(self):
         div = self.divorce
-        return Date(div.children.find_one('tag', 'DATE')) if div else None
+        return wrap_date(div.children.find_one('tag', 'DATE')) if div else None
 
-    @property
-    @cachemethod
+    @derived_property
     def marriage_end(self):
         """
             Logic:
@@ -438,23 +640,19 @@ class Family(Base):
                 "dt": datetime.max,
                 "story_dict": {"line_number": "N/A", "line_value": "never"}}
 
-    @property
-    @cachemethod
+    @cached_property
     def children(self):
-        return [Individual(child.follow_xref()) for child in self.line.children.find('tag', 'CHIL')]
+        return [wrap(Individual, child.follow_xref()) for child in self.line.children.find('tag', 'CHIL')]
 
-    @property
-    @cachemethod
+    @cached_property
     def male_children(self):
         return filter(lambda c: c.sex.val == "M", self.children)
 
-    @property
-    @cachemethod
+    @cached_property
     def female_children(self):
         return filter(lambda c: c.sex.val == "F", self.children)
 
-    @property
-    @cachemethod
+    @derived_property
     def summary(self):
         """ Returns the summary for family
 
@@ -9,21 +9,200 @@ import parser
 NOW = datetime.now()
 NOW_STRING = NOW.strftime("%d %b %Y").upper()
 
+MONTHS = {"JAN": 1, "FEB": 2, "MAR": 3, "APR": 4, "MAY": 5, "JUN": 6,
+          "JUL": 7, "AUG": 8, "SEP": 9, "OCT": 10, "NOV": 11, "DEC": 12}
+DIGITS = frozenset("0123456789")
+
+# Precision of a packed date, see pack_date
+PRECISION_DAY, PRECISION_MONTH, PRECISION_YEAR = 0, 1, 2
+DATE_FORMATS = (('%d %b %Y', PRECISION_DAY), ('%b %Y', PRECISION_MONTH), ('%Y', PRECISION_YEAR))
+
+DATE_CACHE_SIZE = 4096
+"""Integer: The number of date strings parse_date remembers."""
+
 # TODO: Better Comments
 
 
+class LRUCache(object):
+    """ Bounded mapping that forgets the least recently used key when it is full
+
+    :Example:
+        cache = LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        cache.get("a")
+        cache["c"] = 3  # forgets "b"
+
+    """
+
+    # Each key has a [previous, next, key, value] link in a circular list that starts and ends at the root link,
+    # the most recently used key is just before the root.
+
+    def __init__(self, size, on_evict=None):
+        """
+        :param size: The largest number of keys to remember
+        :type size: int
+
+        :param on_evict: Function called with the key and value of each key that is forgotten to make room
+        :type on_evict: function
+        """
+        self.size = size
+        self.on_evict = on_evict
+        self.__links = {}
+        self.__root = []
+        self.clear()
+
+    def __len__(self):
+        return len(self.__links)
+
+    def __contains__(self, key):
+        return key in self.__links
+
+    def __setitem__(self, key, value):
+        links, root = self.__links, self.__root
+        link = links.get(key)
+        if link is not None:
+            link[3] = value
+            self.__move_to_end(link)
+            return
+        if len(links) >= self.size:
+            oldest = root[1]
+            root[1], oldest[1][0] = oldest[1], root
+            del links[oldest[2]]
+            if self.on_evict is not None:
+                self.on_evict(oldest[2], oldest[3])
+        last = root[0]
+        last[1] = root[0] = links[key] = [last, root, key, value]
+
+    def get(self, key, default=None):
+        """ Returns the value of a key and marks it as most recently used, or default if it isn't remembered """
+        link = self.__links.get(key)
+        if link is None:
+            return default
+        self.__move_to_end(link)
+        return link[3]
+
+    def __move_to_end(self, link):
+        prev, next = link[0], link[1]
+        prev[1], next[0] = next, prev
+        root = self.__root
+        last = root[0]
+        last[1] = root[0] = link
+        link[0], link[1] = last, root
+
+    def clear(self):
+        """ Forget every key """
+        self.__links.clear()
+        self.__root[:] = [self.__root, self.__root, None, None]
+
+
+_date_cache = LRUCache(DATE_CACHE_SIZE)
+_UNSUPPORTED = object()
+
+
 def parse_date(s):
     """
     parse linedate string into datetime object
+
+    Partial dates ("JAN 2000", "2000") are the first day of the month or year. See read_date.
+    """
+    if not isinstance(s, basestring):
+        return parse_date_strptime(s)
+    return read_date(s)[1]
+
+
+def pack_date(s):
+    """ Returns a date string as a packed integer, (YYYYMMDD << 2) | precision
+
+    Packed dates of the same precision compare like their dates, and "packed >> 2" compares like the datetime returned
+    by parse_date whatever the precision. The precision is one of PRECISION_DAY, PRECISION_MONTH and PRECISION_YEAR.
+
+    :raises ValueError: if the string isn't a supported date format, or isn't a legitimate date (e.g. 30 FEB 2015)
+
+    :rtype: int
+
+    """
+    return read_date(s)[0]
+
+
+def unpack_date(packed):
+    """ Returns the (YYYYMMDD, precision) of a packed date, see pack_date """
+    return packed >> 2, packed & 3
+
+
+def read_date(s):
+    """ Returns the (packed date, datetime) of a date string
+
+    Dates written the way GEDCOM files usually write them ("2 JAN 2000", "JAN 2000", "2000") are read by
+    split_date, anything else goes through strptime_date, and results are remembered by string in an LRUCache
+    because the same dates are read many times.
+
+    :raises ValueError: if the string isn't a supported date format, or isn't a legitimate date
+
     """
-    for fmt in ('%d %b %Y', '%b %Y', '%Y'):
+    result = _date_cache.get(s, None)
+    if result is None:
         try:
-            return datetime.strptime(s, fmt)
+            result = split_date(s) or strptime_date(s)
         except ValueError:
-            pass
+            result = _UNSUPPORTED
+        _date_cache[s] = result
+    if result is _UNSUPPORTED:
+        raise ValueError("Unsupported Date Format")
+    return result
+
+
+def split_date(s):
+    """ Read a date string with single spaces and an upper case month without strptime
+
+    :return: (packed date, datetime) of the date, or None if the string is not in that form (it may still be a valid
+    date)
+    :rtype: tuple or None
+
+    """
+    parts = s.split(" ")
+    year = parts[-1]
+    if len(parts) > 3 or len(year) != 4 or not DIGITS.issuperset(year):
+        return None
+    month, day = 1, "1"
+    if len(parts) > 1:
+        month = MONTHS.get(parts[-2])
+        if month is None:
+            return None
+    if len(parts) == 3:
+        day = parts[0]
+        if not 0 < len(day) < 3 or not DIGITS.issuperset(day):
+            return None
+    try:
+        dt = datetime(int(year), month, int(day))
+    except ValueError:
+        return None
+    return ((dt.year * 10000 + dt.month * 100 + dt.day) << 2) | (3 - len(parts)), dt
+
+
+def strptime_date(s):
+    """ Read a date string with datetime.strptime, trying each supported format in turn
+
+    :return: (packed date, datetime) of the date
+    :rtype: tuple
+
+    """
+    for fmt, precision in DATE_FORMATS:
+        try:
+            dt = datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+        return ((dt.year * 10000 + dt.month * 100 + dt.day) << 2) | precision, dt
     raise ValueError("Unsupported Date Format")
 
 
+def parse_date_strptime(s):
+    """
+    parse linedate string into datetime object with datetime.strptime, trying each supported format in turn
+    """
+    return strptime_date(s)[1]
+
+
 def days_between(a, b):
     """ Calculate the days between two dates
 
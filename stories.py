@@ -2,6 +2,7 @@
 Story Functions
 """
 import logging
+import multiprocessing
 import sys
 from datetime import datetime
 from itertools import combinations, groupby
@@ -28,9 +29,13 @@ def individual_summary(gedcom_file):
     # TODO: Write Docstring
     # TODO: add message and bullets into summary
     r = []
-    logger.info(LOG_HEADING.format("Summary", "Individuals"))
+    log = handled(logging.INFO)
+    if log:
+        logger.info(LOG_HEADING.format("Summary", "Individuals"))
     for indi in gedcom_file.individuals:
         r.append(indi.summary)
+        if not log:
+            continue
         logger.info(LOG_ENTRY.format(indi))
         logger.info(LOG_BULLET_ALT.format("Gender", indi.sex))
         logger.info(LOG_BULLET_ALT.format("Birth date", indi.birth_date))
@@ -55,9 +60,13 @@ def family_summary(gedcom_file):
     # TODO: Write Docstring
     r = []
     # TODO: add message and bullets into summary
-    logger.info(LOG_HEADING.format("Summary", "Families"))
+    log = handled(logging.INFO)
+    if log:
+        logger.info(LOG_HEADING.format("Summary", "Families"))
     for fam in gedcom_file.families:
         r.append(fam.summary)
+        if not log:
+            continue
         logger.info(LOG_ENTRY.format(fam))
         logger.info(LOG_BULLET_ALT.format("Husband", fam.husband))
         logger.info(LOG_BULLET_ALT.format("Wife", fam.wife))
@@ -66,41 +75,210 @@ def family_summary(gedcom_file):
     return r
 
 
-def story(id_):
-    """ Function decorator used to find both outcomes of a story, and log and return the results """
+def handled(level):
+    """ Returns True if a record of a level logged to the story logger would be written by any handler
+
+    Logger.isEnabledFor only checks the level of the loggers, the handlers also have to accept the level, e.g. the
+    passed cases are logged at DEBUG and are only written if a handler is at DEBUG (see show_passed of run).
+
+    :param level: A logging level, e.g. logging.DEBUG
+    :type level: int
+
+    :rtype: bool
+
+    """
+    if not logger.isEnabledFor(level):
+        return False
+    current = logger
+    while current is not None:
+        if any(level >= handler.level for handler in current.handlers):
+            return True
+        current = current.parent if current.propagate else None
+    return False
+
+
+def log_story(r):
+    """ Log the results dictionary of a story
+
+    :note: Cases are only formatted for the log if a handler will write them, see handled.
+
+    """
+    if handled(logging.INFO):
+        logger.info(LOG_HEADING.format(r["id"], r["name"].replace("_", " ").title()))
+        # TODO: log story description
+        logger.info("~~~~")
+    if handled(logging.DEBUG):
+        logger.debug("[passed]")
+        for entry in r["output"]["passed"]:
+            h2 = LOG_ENTRY.format(entry.get("message", entry))
+            logger.debug(h2)
+            for bullet in entry.get("bullets", []):
+                logger.debug(LOG_BULLET.format(bullet))
+    if handled(logging.INFO):
+        logger.info("[failed]")
+        for entry in r["output"]["failed"]:
+            h2 = LOG_ENTRY.format(entry.get("message", entry))
+            logger.info(h2)
+            for bullet in entry.get("bullets", []):
+                logger.info(LOG_BULLET.format(bullet))
+        logger.info("~~~~")
+
+
+def story(id_, needs=()):
+    """ Function decorator used to find both outcomes of a story, and log and return the results
+
+    :note: The function that finds the outcomes of a story is kept as the "check" attribute of the decorated
+    function, so that it can be run on many files (e.g. the records of a stream) before logging, see run_stream.
+
+    :param id_: The id of the story, e.g. "Error US01"
+    :type id_: str
+
+    :param needs: The derived datasets of the file the story reads (e.g. "ages", "kinship"), which are built before
+    the story runs, see parser.File.prepare and prepare_stories.
+    :type needs: tuple of str
+
+    """
 
     def story_decorator(func):
+        def check(gedcom_file):
+            gedcom_file.prepare(*needs)
+            return func(gedcom_file)
+
         def func_wrapper(gedcom_file):
             if type(gedcom_file) is not gedcom.parser.File:
                 raise TypeError("Story function must be provided a gedcom file object.")
-            r = {"id": id_, "name": func.__name__, "output": func(gedcom_file)}
+            r = {"id": id_, "name": func.__name__, "output": gedcom.metrics.story_timer(id_, check)(gedcom_file)}
 
             # Log Text Results To User Output
-            logger.info(LOG_HEADING.format(r["id"], r["name"].replace("_", " ").title()))
-            # TODO: log story description
-            logger.info("~~~~")
-            logger.debug("[passed]")
-            for entry in r["output"]["passed"]:
-                h2 = LOG_ENTRY.format(entry.get("message", entry))
-                logger.debug(h2)
-                for bullet in entry.get("bullets", []):
-                    logger.debug(LOG_BULLET.format(bullet))
-            logger.info("[failed]")
-            for entry in r["output"]["failed"]:
-                h2 = LOG_ENTRY.format(entry.get("message", entry))
-                logger.info(h2)
-                for bullet in entry.get("bullets", []):
-                    logger.info(LOG_BULLET.format(bullet))
-            logger.info("~~~~")
+            log_story(r)
 
             # Return Results Dictionary
             return r
 
+        func_wrapper.id = id_
+        func_wrapper.check = check
+        func_wrapper.needs = tuple(needs)
+        func_wrapper.__name__ = func.__name__
+        func_wrapper.__doc__ = func.__doc__
         return func_wrapper
 
     return story_decorator
 
 
+def run_stream(story_function, records):
+    """ Run a story over a stream of records, and log and return the combined results
+
+    Only the current record is held in memory, so this should only be used with stories that check each record on
+    its own, such as dates_before_current_date and birth_before_death.
+
+    :param story_function: A function decorated with story
+    :type story_function: function
+
+    :param records: The records to check
+    :type records: iterator of parser.File, see gedcom.iter_records
+
+    :Example:
+        run_stream(birth_before_death, gedcom.iter_records(filename))
+
+    """
+    r = {"id": story_function.id, "name": story_function.__name__, "output": {"passed": [], "failed": []}}
+    for record in records:
+        output = story_function.check(record)
+        r["output"]["passed"].extend(output["passed"])
+        r["output"]["failed"].extend(output["failed"])
+    log_story(r)
+    return r
+
+
+def prepare_stories(gedcom_file, story_functions):
+    """ Build the derived datasets needed by any of the stories, and only those, see parser.File.prepare
+
+    :param gedcom_file: GEDCOM File to check
+    :type gedcom_file: parser.File
+
+    :param story_functions: Functions decorated with story
+    :type story_functions: list of function
+
+    :return: The names of the datasets needed, in the order they were built
+    :rtype: list of str
+
+    """
+    needs = []
+    for story_function in story_functions:
+        needs.extend(name for name in story_function.needs if name not in needs)
+    return gedcom_file.prepare(*needs)
+
+
+_shared = None  # the (gedcom_file, story_functions) of run_stories_parallel, inherited by the forked workers
+
+
+def _check_shared(k):
+    """ Returns the outcomes of the k-th story of run_stories_parallel run in a worker process, and the metrics of
+    running it if metrics are enabled (see gedcom.metrics.merge)
+    """
+    gedcom_file, story_functions = _shared
+    if not gedcom.metrics.enabled():
+        return story_functions[k].check(gedcom_file), None
+    gedcom.metrics.reset()
+    output = gedcom.metrics.story_timer(story_functions[k].id, story_functions[k].check)(gedcom_file)
+    return output, gedcom.metrics.snapshot()
+
+
+def run_stories_parallel(gedcom_file, story_functions, processes=None):
+    """ Run many stories on a file in a process pool, and log and return the results of each in order
+
+    The file is not sent to the workers, they are forked after it has been read and the derived datasets the stories
+    need have been built (see prepare_stories), and share its memory with the main process. Only the index of each
+    story is sent to a worker, and only its outcomes are sent back. The results are logged by the main process in
+    the order of story_functions, so the logs are the same as running each story in turn.
+
+    :note: Needs fork, so it is only supported on unix.
+
+    :param gedcom_file: GEDCOM File to check
+    :type gedcom_file: parser.File
+
+    :param story_functions: Functions decorated with story
+    :type story_functions: list of function
+
+    :param processes: The number of worker processes, defaults to the number of CPUs.
+    :type processes: int
+
+    :return: The results dictionary of each story
+    :rtype: list of dict
+
+    """
+    global _shared
+    if type(gedcom_file) is not gedcom.parser.File:
+        raise TypeError("Story function must be provided a gedcom file object.")
+
+    # Build what every story reads before forking, so that each worker doesn't build it again
+    for name in ("individuals", "families", "dates"):
+        getattr(gedcom_file, name)
+    prepare_stories(gedcom_file, story_functions)
+
+    _shared = gedcom_file, story_functions
+    pool = multiprocessing.Pool(processes)
+    try:
+        outputs_and_metrics = pool.map(_check_shared, range(len(story_functions)), chunksize=1)
+    finally:
+        pool.terminate()
+        pool.join()
+        _shared = None
+
+    outputs = []
+    for output, metrics in outputs_and_metrics:
+        outputs.append(output)
+        if metrics is not None:
+            gedcom.metrics.merge(metrics)
+
+    results = []
+    for story_function, output in zip(story_functions, outputs):
+        r = {"id": story_function.id, "name": story_function.__name__, "output": output}
+        log_story(r)
+        results.append(r)
+    return results
+
+
 @story("Error US01")
 def dates_before_current_date(gedcom_file):
     """ Dates (birth, marriage, divorce, death) should not be after the current date
@@ -117,6 +295,8 @@ def dates_before_current_date(gedcom_file):
     bul = ["Current Date is {0} (date script ran)".format, "{0} date is {1}".format]
 
     for date in gedcom_file.dates:
+        if not date.legitimate:
+            continue  # Not a date, see reject_illegitimate_dates (US42)
         if date.type in ("birth", "marriage", "divorce", "death"):
             out = {"bullets": [bul[0](NOW_STRING), bul[1](date.type.capitalize(), date)]}
             passed, word = (True, "before") if date.dt < NOW else (True, "on") if date.dt == NOW else (False, "after")
@@ -131,7 +311,7 @@ def dates_before_current_date(gedcom_file):
     return r
 
 
-@story("Error US02")
+@story("Error US02", needs=("events",))
 def birth_before_marriage(gedcom_file):
     """ Birth should occur before marriage of an individual
 
@@ -146,21 +326,24 @@ def birth_before_marriage(gedcom_file):
     msg = {"passed": "{0} was born before {1} marriage".format,
            "failed": "{0} was born after {1} marriage".format}
     bul = "{0} date is {1}".format
+    date = gedcom_file.events.date
 
     for indi in gedcom_file.individuals:
-        if not indi.has("birth_date"):
+        birth_date = date("BIRT", indi.line)
+        if birth_date is None:
             continue  # Project Overview Assumptions not met
         for fam in indi.families("FAMS"):
-            if not fam.has("marriage_date"):
+            marriage_date = date("MARR", fam.line)
+            if marriage_date is None:
                 continue  # Project Overview Assumptions not met
-            status = "passed" if indi.birth_date < fam.marriage_date else "failed"
+            status = "passed" if birth_date < marriage_date else "failed"
             r[status].append({"message": msg[status](indi, indi.pronoun),
-                              "bullets": [bul("Birth", indi.birth_date), bul("Marriage", indi.birth_date)]})
+                              "bullets": [bul("Birth", birth_date), bul("Marriage", birth_date)]})
 
     return r
 
 
-@story("Error US03")
+@story("Error US03", needs=("events",))
 def birth_before_death(gedcom_file):
     """ Birth should occur before death of an individual
 
@@ -175,20 +358,22 @@ def birth_before_death(gedcom_file):
     msg = {"passed": "{0} was born before {1} death".format,
            "failed": "{0} was born after {1} death".format}
     bul = "{0} date is {1}".format
+    date = gedcom_file.events.date
 
     for indi in gedcom_file.individuals:
-        if not indi.has("birth_date"):
+        birth_date, death_date = date("BIRT", indi.line), date("DEAT", indi.line)
+        if birth_date is None:
             continue  # Project Overview Assumptions not met
-        if not indi.has("death_date"):
+        if death_date is None:
             continue  # Individual not applicable to story
-        status = "passed" if indi.birth_date < indi.death_date else "failed"
+        status = "passed" if birth_date < death_date else "failed"
         r[status].append({"message": msg[status](indi, indi.pronoun),
-                          "bullets": [bul("Birth", indi.birth_date), bul("Death", indi.death_date)]})
+                          "bullets": [bul("Birth", birth_date), bul("Death", death_date)]})
 
     return r
 
 
-@story("Error US04")
+@story("Error US04", needs=("events",))
 def marriage_before_divorce(gedcom_file):
     """ Marriage should occur before divorce of spouses, and divorce can only occur after marriage
 
@@ -202,20 +387,23 @@ def marriage_before_divorce(gedcom_file):
     r = {"passed": [], "failed": []}
     msg = {"passed": "{0} with husband {1} and wife {2} has marriage on {3} before divorce on {4}".format,
            "failed": "{0} with husband {1} and wife {2} has marriage on {3} after divorce on {4}".format}
+    date = gedcom_file.events.date
+
     for fam in gedcom_file.families:
+        marriage_date, divorce_date = date("MARR", fam.line), date("DIV", fam.line)
 
-        if not fam.has("marriage_date"):
+        if marriage_date is None:
             continue  # Project Overview Assumptions not met
-        if not fam.has("divorce_date"):
+        if divorce_date is None:
             continue  # Family not applicable to story
 
-        status = "passed" if fam.marriage_date < fam.divorce_date else "failed"
-        r[status].append({"message": msg[status](fam, fam.husband, fam.wife, fam.marriage_date, fam.divorce_date)})
+        status = "passed" if marriage_date < divorce_date else "failed"
+        r[status].append({"message": msg[status](fam, fam.husband, fam.wife, marriage_date, divorce_date)})
 
     return r
 
 
-@story("Error US05")
+@story("Error US05", needs=("events",))
 def marriage_before_death(gedcom_file):
     """ Marriage should occur before death of either spouse
 
@@ -230,39 +418,41 @@ def marriage_before_death(gedcom_file):
     msg_intro = "{0} with marriage on {1} ".format
     pass_msg = "has {0} {1} with death {2} after marriage".format
     fail_msg = "has {0} {1} with death {2} before marriage".format
+    date = gedcom_file.events.date
+
     for fam in gedcom_file.families:
+        marriage_date = date("MARR", fam.line)
 
-        if not fam.has("marriage_date"):
+        if marriage_date is None:
             continue  # Project Overview Assumptions not met
 
-        intro = msg_intro(fam, fam.marriage_date)
-        if fam.husband.has("death_date") and fam.wife.has("death_date"):
-            if fam.marriage_date < fam.husband.death_date:
-                passed, msg_husb = True, pass_msg("husband", fam.husband, fam.husband.death_date)
+        intro = msg_intro(fam, marriage_date)
+        husband_death, wife_death = date("DEAT", fam.husband.line), date("DEAT", fam.wife.line)
+        if husband_death is not None and wife_death is not None:
+            if marriage_date < husband_death:
+                passed, msg_husb = True, pass_msg("husband", fam.husband, husband_death)
             else:
-                passed, msg_husb = False, fail_msg("husband", fam.husband, fam.husband.death_date)
-            if fam.marriage_date < fam.wife.death_date:
-                passed, msg_wife = passed and True, pass_msg("wife", fam.wife, fam.wife.death_date)
+                passed, msg_husb = False, fail_msg("husband", fam.husband, husband_death)
+            if marriage_date < wife_death:
+                passed, msg_wife = passed and True, pass_msg("wife", fam.wife, wife_death)
             else:
-                passed, msg_wife = passed and False, fail_msg("wife", fam.wife, fam.wife.death_date)
+                passed, msg_wife = passed and False, fail_msg("wife", fam.wife, wife_death)
             status = "passed" if passed else "failed"
             r[status].append({"message": intro + msg_husb + " and " + msg_wife})
-        elif fam.husband.has("death_date"):
-            if fam.marriage_date < fam.husband.death_date:
-                r["passed"].append(
-                        {"message": intro + pass_msg("husband", fam.husband, fam.husband.death_date)})
+        elif husband_death is not None:
+            if marriage_date < husband_death:
+                r["passed"].append({"message": intro + pass_msg("husband", fam.husband, husband_death)})
             else:
-                r["failed"].append(
-                        {"message": intro + fail_msg("husband", fam.husband, fam.husband.death_date)})
-        elif fam.wife.has("death_date"):
-            if fam.marriage_date < fam.wife.death_date:
-                r["passed"].append({"message": intro + pass_msg("wife", fam.wife, fam.wife.death_date)})
+                r["failed"].append({"message": intro + fail_msg("husband", fam.husband, husband_death)})
+        elif wife_death is not None:
+            if marriage_date < wife_death:
+                r["passed"].append({"message": intro + pass_msg("wife", fam.wife, wife_death)})
             else:
-                r["failed"].append({"message": intro + fail_msg("wife", fam.wife, fam.wife.death_date)})
+                r["failed"].append({"message": intro + fail_msg("wife", fam.wife, wife_death)})
     return r
 
 
-@story("Error US06")
+@story("Error US06", needs=("events",))
 def divorce_before_death(gedcom_file):
     """ Divorce can only occur before death of both spouses
 
@@ -277,38 +467,42 @@ def divorce_before_death(gedcom_file):
     msg_intro = "{0} with divorce on {1} ".format
     pass_msg = "has {0} {1} with death {2} before divorce".format
     fail_msg = "has {0} {1} with death {2} after divorce".format
+    date = gedcom_file.events.date
+
     for fam in gedcom_file.families:
+        divorce_date = date("DIV", fam.line)
 
-        if not fam.has("divorce_date"):
+        if divorce_date is None:
             continue  # Family not applicable to story
 
-        intro = msg_intro(fam, fam.divorce_date)
-        if fam.husband.has("death_date") and fam.wife.has("death_date"):
-            if fam.husband.death_date < fam.divorce_date:
-                passed, msg_husb = True, pass_msg("husband", fam.husband, fam.husband.death_date)
+        intro = msg_intro(fam, divorce_date)
+        husband_death, wife_death = date("DEAT", fam.husband.line), date("DEAT", fam.wife.line)
+        if husband_death is not None and wife_death is not None:
+            if husband_death < divorce_date:
+                passed, msg_husb = True, pass_msg("husband", fam.husband, husband_death)
             else:
-                passed, msg_husb = False, fail_msg("husband", fam.husband, fam.husband.death_date)
-            if fam.wife.death_date < fam.divorce_date:
-                passed, msg_wife = passed and True, pass_msg("wife", fam.wife, fam.wife.death_date)
+                passed, msg_husb = False, fail_msg("husband", fam.husband, husband_death)
+            if wife_death < divorce_date:
+                passed, msg_wife = passed and True, pass_msg("wife", fam.wife, wife_death)
             else:
-                passed, msg_wife = passed and False, pass_msg("wife", fam.wife, fam.wife.death_date)
+                passed, msg_wife = passed and False, pass_msg("wife", fam.wife, wife_death)
             status = "passed" if passed else "failed"
             r[status].append({"message": intro + msg_husb + " and " + msg_wife})
-        elif fam.husband.has("death_date"):
-            if fam.husband.death_date < fam.divorce_date:
-                r["passed"].append({"message": intro + pass_msg("husband", fam.husband, fam.husband.death_date)})
+        elif husband_death is not None:
+            if husband_death < divorce_date:
+                r["passed"].append({"message": intro + pass_msg("husband", fam.husband, husband_death)})
             else:
-                r["failed"].append({"message": intro + fail_msg("husband", fam.husband, fam.husband.death_date)})
-        elif fam.wife.has("death_date"):
-            if fam.wife.death_date < fam.divorce_date:
-                r["passed"].append({"message": intro + pass_msg("wife", fam.wife, fam.wife.death_date)})
+                r["failed"].append({"message": intro + fail_msg("husband", fam.husband, husband_death)})
+        elif wife_death is not None:
+            if wife_death < divorce_date:
+                r["passed"].append({"message": intro + pass_msg("wife", fam.wife, wife_death)})
             else:
-                r["failed"].append({"message": intro + fail_msg("wife", fam.wife, fam.wife.death_date)})
+                r["failed"].append({"message": intro + fail_msg("wife", fam.wife, wife_death)})
 
     return r
 
 
-@story("Error US07")
+@story("Error US07", needs=("ages",))
 def less_then_150_years_old(gedcom_file):
     """ Death should be less than 150 years after birth for dead people, and
         current date should be less than 150 years after birth for all living people
@@ -323,16 +517,17 @@ def less_then_150_years_old(gedcom_file):
     r = {"passed": [], "failed": []}
     msg = {"death": "Individual {0} was born {1} and died {2} years later on {3}".format,
            "alive": "Individual {0} was born {1} and is {2} years old as of {3} (current date)".format}
+    ages = gedcom_file.ages.age
 
-    for indi in gedcom_file.individuals:
+    for i, indi in enumerate(gedcom_file.individuals):
         if not indi.has("birth_date"):
             continue  # Project Overview Assumptions not met
         out = {}
         if indi.has("death_date"):
-            out["message"] = msg["death"](indi, indi.birth_date, indi.age, indi.death_date)
+            out["message"] = msg["death"](indi, indi.birth_date, ages[i], indi.death_date)
         else:
-            out["message"] = msg["alive"](indi, indi.birth_date, indi.age, NOW_STRING)
-        r["passed"].append(out) if indi.age < 150 else r["failed"].append(out)
+            out["message"] = msg["alive"](indi, indi.birth_date, ages[i], NOW_STRING)
+        r["passed"].append(out) if ages[i] < 150 else r["failed"].append(out)
 
     return r
 
@@ -351,7 +546,8 @@ def birth_before_marriage_of_parents(gedcom_file):
     r = {"passed": [], "failed": []}
     div_msg = "{0} with marriage date {1} and divorce date {2} has a child {3} born {4}"
     mar_msg = "{0} with marriage date {1} has a child {2} born {3}"
-    for fam in (f for f in gedcom_file.families if f.has("marriage_date")):
+
+    for fam in gedcom_file.families:
 
         if not fam.has("marriage_date"):
             continue  # Project Overview Assumptions not met
@@ -411,7 +607,7 @@ def birth_before_death_of_parents(gedcom_file):
     return r
 
 
-@story("Anomaly US10")
+@story("Anomaly US10", needs=("ages",))
 def marriage_after_14(gedcom_file):
     """ Marriage should be at least 14 years after birth of both spouses
 
@@ -425,8 +621,9 @@ def marriage_after_14(gedcom_file):
     r = {"passed": [], "failed": []}
     msg = "{0} has marriage date {1}".format
     bul = "{0} {1} born {2} [married at {3} years old]".format
+    ages = gedcom_file.ages
 
-    for fam in gedcom_file.families:
+    for f, fam in enumerate(gedcom_file.families):
         # Check Project Overview Assumptions
         if not fam.has("marriage_date"):
             continue  # Project Overview Assumptions not met
@@ -435,14 +632,15 @@ def marriage_after_14(gedcom_file):
         if not fam.has("wife") or not fam.wife.has("birth_date"):
             continue  # Project Overview Assumptions not met
 
-        status = "passed" if (fam.wife_marriage_age > 14) and (fam.husband_marriage_age > 14) else "failed"
+        wife_age, husband_age = ages.wife_marriage_age[f], ages.husband_marriage_age[f]
+        status = "passed" if (wife_age > 14) and (husband_age > 14) else "failed"
         r[status].append({"message": msg(fam, fam.marriage_date),
-                          "bullets": [bul("Wife", fam.wife, fam.wife.birth_date, fam.wife_marriage_age),
-                                      bul("Husband", fam.husband, fam.husband.birth_date, fam.husband_marriage_age)]})
+                          "bullets": [bul("Wife", fam.wife, fam.wife.birth_date, wife_age),
+                                      bul("Husband", fam.husband, fam.husband.birth_date, husband_age)]})
     return r
 
 
-@story("Anomaly US11")
+@story("Anomaly US11", needs=("ages", "kinship"))
 def no_bigamy(gedcom_file):
     """ Marriage should not occur during marriage to another spouse
 
@@ -459,28 +657,34 @@ def no_bigamy(gedcom_file):
            "failed": "Individual {0} has non-overlapping marriages".format}
 
     bul = "{0} marriage starts {1} and ends {2} (line {3}) because {4}".format
+    ages, kinship = gedcom_file.ages, gedcom_file.kinship
 
     for indi in gedcom_file.individuals:
-        # Get all combinations of marriages this individual is or has been in
-        for fam_1, fam_2 in combinations(indi.families("FAMS"), 2):
+        # Check Project Overview Assumptions
+        marriages = [fam for fam in indi.families("FAMS") if fam.has("marriage_date")]
+        if len(marriages) < 2:
+            continue
 
-            # Check Project Overview Assumptions
-            if (not fam_1.has("marriage_date")) or (not fam_2.has("marriage_date")):
-                continue  # Project Overview Assumptions not met
+        # Find the overlapping marriages with the marriage intervals of the age table, instead of testing every pair
+        overlaps = gedcom.ages.overlapping_pairs([ages.marriage_interval(kinship.family_index(fam.line))
+                                                  for fam in marriages])
 
+        # Report all combinations of marriages this individual is or has been in
+        for (a, fam_1), (b, fam_2) in combinations(enumerate(marriages), 2):
             s1, e1 = fam_1.marriage_date, fam_1.marriage_end
             s2, e2 = fam_2.marriage_date, fam_2.marriage_end
 
-            b = [bul(fam_1, s1, e1["story_dict"].get("line_value"), e1["story_dict"]["line_number"], e1["reason"]),
-                 bul(fam_2, s2, e2["story_dict"].get("line_value"), e2["story_dict"]["line_number"], e2["reason"])]
+            bullets = [
+                bul(fam_1, s1, e1["story_dict"].get("line_value"), e1["story_dict"]["line_number"], e1["reason"]),
+                bul(fam_2, s2, e2["story_dict"].get("line_value"), e2["story_dict"]["line_number"], e2["reason"])]
 
-            status = "failed" if (s1.dt <= e2["dt"]) and (e1["dt"] >= s2.dt) else "passed"
-            r[status].append({"message": msg[status](indi), "bullets": b})
+            status = "failed" if (a, b) in overlaps else "passed"
+            r[status].append({"message": msg[status](indi), "bullets": bullets})
 
     return r
 
 
-@story("Anomaly US12")
+@story("Anomaly US12", needs=("ages",))
 def parents_not_too_old(gedcom_file):
     """ Mother should be less than 60 years older than her children and
         father should be less than 80 years older than his children
@@ -496,7 +700,9 @@ def parents_not_too_old(gedcom_file):
     msg = "{0} with child {1} born {2} has mother {3} born {4} [{5} years older than child] " \
           + "and father {6} born {7} [{8} years older than child]."
     msg = msg.format
-    for fam in gedcom_file.families:
+    ages = gedcom_file.ages
+
+    for f, fam in enumerate(gedcom_file.families):
         # Check Project Overview Assumptions
         if not fam.has("marriage_date"):
             continue  # Project Overview Assumptions not met
@@ -505,13 +711,11 @@ def parents_not_too_old(gedcom_file):
         if not fam.has("wife") or not fam.wife.has("birth_date"):
             continue  # Project Overview Assumptions not met
 
-        for child in fam.children:
+        for child, (m_yrs_older, f_yrs_older) in zip(fam.children, ages.parent_gaps(f)):
             # Check Project Overview Assumptions
             if not child.has("birth_date"):
                 continue  # Project Overview Assumptions not met
 
-            m_yrs_older = gedcom.tools.years_between(child.birth_date.dt, fam.wife.birth_date.dt)
-            f_yrs_older = gedcom.tools.years_between(child.birth_date.dt, fam.husband.birth_date.dt)
             status = "passed" if (m_yrs_older < 60) and (f_yrs_older < 80) else "failed"
             r[status].append({"message": msg(fam, child, child.birth_date, fam.wife, fam.wife.birth_date, m_yrs_older,
                                              fam.husband, fam.husband.birth_date, f_yrs_older)})
@@ -519,12 +723,15 @@ def parents_not_too_old(gedcom_file):
     return r
 
 
-@story("Anomaly US13")
+@story("Anomaly US13", needs=("ages",))
 def siblings_spacing(gedcom_file):
     """ Birth dates of siblings should be more than 8 months apart or less than 2 days apart
 
     :note: Assume 8 months is (30 days)*(8 months)=(240 days)
 
+    :note: Each sibling is compared with the sibling born next, so siblings born less than two days after one another
+    are treated as one multiple birth.
+
     :sprint: 3
     :author: Constantine Davantzis
 
@@ -535,9 +742,13 @@ def siblings_spacing(gedcom_file):
     r = {"passed": [], "failed": []}
     msg = "{0} has siblings born {1} apart ({2} days)".format
     bullet_msg = "Sibling {0} born {1}".format
-    for fam in gedcom_file.families:
-        for sib_a, sib_b in combinations((c for c in fam.children if c.has("birth_date")), 2):
-            days = gedcom.tools.days_between(sib_a.birth_date.dt, sib_b.birth_date.dt)
+    ages = gedcom_file.ages
+
+    for f, fam in enumerate(gedcom_file.families):
+        # Children without a birth date are not in the birth order, Project Overview Assumptions not met
+        births, order, children = ages.child_births(f), ages.birth_order(f), fam.children
+        for a, b in zip(order, order[1:]):
+            sib_a, sib_b, days = children[a], children[b], births[b] - births[a]
             out = {"bullets": [bullet_msg(sib_a, sib_a.birth_date), bullet_msg(sib_b, sib_b.birth_date)]}
             if days < 2:
                 out["message"] = msg(fam, "less than two days", days, sib_a, sib_a.birth_date, sib_b, sib_b.birth_date)
@@ -552,7 +763,7 @@ def siblings_spacing(gedcom_file):
     return r
 
 
-@story("Anomaly US14")
+@story("Anomaly US14", needs=("ages",))
 def less_than_5_multiple_births(gedcom_file):
     """ No more than five siblings should be born at the same time
 
@@ -568,8 +779,12 @@ def less_than_5_multiple_births(gedcom_file):
     msg_pass = "{0} has no more than 5 siblings born on the same date, with {1} {2} born on {3}".format
     msg_fail = "{0} has more than 5 siblings born on the same date, with {1} siblings born on {2}".format
 
-    for fam in gedcom_file.families:
-        group = groupby(sorted(fam.children, key=lambda x: x.birth_date.dt), lambda x: x.birth_date)
+    ages = gedcom_file.ages
+
+    for f, fam in enumerate(gedcom_file.families):
+        children = fam.children
+        # Children without a birth date are not in the birth order, Project Overview Assumptions not met
+        group = groupby((children[p] for p in ages.birth_order(f)), lambda x: x.birth_date)
         for date, born_on_date in ((date, list(born_on_date)) for date, born_on_date in group):
             i = len(born_on_date)
             out = {"bullets": ["Sibling {0} born {1}".format(c, c.birth_date) for c in born_on_date]}
@@ -597,6 +812,7 @@ def fewer_than_15_siblings(gedcom_file):
     r = {"passed": [], "failed": []}
     msg = ["{0} has {1} children".format, "{0} has {1} child".format]
     bul = "Child {0}: {1}".format
+
     for fam in gedcom_file.families:
         i = len(fam.children)
         out = {"message": msg[1](fam, i) if i == 1 else msg[0](fam, i),
@@ -605,7 +821,7 @@ def fewer_than_15_siblings(gedcom_file):
     return r
 
 
-@story("Anomaly US16")
+@story("Anomaly US16", needs=("names",))
 def male_last_names(gedcom_file):
     """ All male members of a family should have the same last name
 
@@ -620,12 +836,15 @@ def male_last_names(gedcom_file):
 
     sib_msg = "{0} with male siblings {1} and {2}{3} have the same surname".format  # Sibling Check Message Formatter
     dad_msg = "{0} with father {1} and son {2}{3} have the same surname".format  # Dad/Son Check Message Formatter
+    surname = lambda indi: gedcom_file.names.names_of(indi.line)[1]
 
     for fam in gedcom_file.families:
+        # Surnames come from the name index, so each is looked up once rather than parsed for every pair
+        surnames = dict((id(child), surname(child)) for child in fam.male_children)
 
         # Compare children to each other
         for sib_a, sib_b in combinations(fam.male_children, 2):
-            if sib_a.name.surname == sib_b.name.surname:
+            if surnames[id(sib_a)] == surnames[id(sib_b)]:
                 r["passed"].append({"message": sib_msg(fam, sib_a, sib_b, "")})
             else:
                 r["failed"].append({"message": sib_msg(fam, sib_a, sib_b, " do not")})
@@ -637,8 +856,9 @@ def male_last_names(gedcom_file):
             continue  # Project Overview Assumptions not met
 
         # Compare father to each child
+        father_surname = surname(fam.husband)
         for child in fam.male_children:
-            if fam.husband.name.surname == child.name.surname:
+            if surnames[id(child)] == father_surname:
                 r["passed"].append({"message": dad_msg(fam, fam.husband, child, "")})
             else:
                 r["failed"].append({"message": dad_msg(fam, fam.husband, child, " do not")})
@@ -646,7 +866,7 @@ def male_last_names(gedcom_file):
     return r
 
 
-@story("Anomaly US17")
+@story("Anomaly US17", needs=("ancestry",))
 def no_marriages_to_descendants(gedcom_file):
     """ Parents should not marry any of their descendants
 
@@ -662,8 +882,13 @@ def no_marriages_to_descendants(gedcom_file):
     passed_message = "Individual {0} is not married to any descendants".format
     failed_message = "Individual {0} is married to {1} of {2} descendants".format
     bullet = "Married to {0} {1} in {2}".format
+
     for indi in gedcom_file.individuals:
         b = []
+        # Only list the descendants of individuals married to one of them
+        if not any(indi.is_ancestor_of(spouse) for fam, spouse in indi.families_and_spouses):
+            r["passed"].append({"message": passed_message(indi), "bullets": b})
+            continue
         for descendant in indi.descendants:
             for fam, spouse in indi.families_and_spouses:
                 if spouse == descendant:
@@ -692,6 +917,7 @@ def siblings_should_not_marry(gedcom_file):
     bullet = "Married to sibling {0}. Sibling in {1}, Married in {2}".format
     # Keep track of individuals checked just in case individual is a child in multiple families (ERROR)
     checked = []
+
     for fam in gedcom_file.families:
         for indi in (i for i in fam.children if (i not in checked)):
             siblings = [s for s in fam.children if s.xref != indi.xref]
@@ -709,7 +935,7 @@ def siblings_should_not_marry(gedcom_file):
     return r
 
 
-@story("Anomaly US19")
+@story("Anomaly US19", needs=("kinship",))
 def first_cousins_should_not_marry(gedcom_file):
     """ First cousins should not marry one another
 
@@ -741,7 +967,7 @@ def first_cousins_should_not_marry(gedcom_file):
     return r
 
 
-@story("Anomaly US20")
+@story("Anomaly US20", needs=("kinship",))
 def aunts_and_uncles(gedcom_file):
     """ Aunts and uncles should not marry their nieces or nephews
 
@@ -818,9 +1044,16 @@ def unique_ids(gedcom_file):
 
     """
 
-    def _matches(a):
-        m = {}
-        [m[b.xref].append(b) if b.xref in m else m.update({b.xref: [b]}) for b in a]
+    duplicates = gedcom_file.duplicate_xrefs
+
+    def _matches(a, wrapper_class, record_tag):
+        # Records sharing an xref were found when the file was read, see parser.File.duplicate_xrefs. Every other
+        # record is the only one with its xref.
+        m = [(b.xref, [b]) for b in a if b.xref not in duplicates]
+        for xref, lines in duplicates.iteritems():
+            with_xref = [gedcom_file.wrap(wrapper_class, line) for line in lines if line.get("tag") == record_tag]
+            if with_xref:
+                m.append((xref, with_xref))
         return m
 
     def _sort(x):
@@ -831,15 +1064,15 @@ def unique_ids(gedcom_file):
 
     r = {"passed": [], "failed": []}
 
-    l = [{"items": gedcom_file.individuals,
+    l = [{"items": gedcom_file.individuals, "class": gedcom.tag.Individual, "tag": "INDI",
           "msg": {"passed": "{0} individual found with xref {1}".format,
                   "failed": "{0} individuals found with xref {1}".format}},
-         {"items": gedcom_file.families,
+         {"items": gedcom_file.families, "class": gedcom.tag.Family, "tag": "FAM",
           "msg": {"passed": "{0} family found with xref {1}".format,
                   "failed": "{0} families found with xref {1}".format}}]
 
     for d in l:
-        for xref, with_xref in iter(sorted(_matches(d["items"]).iteritems(), key=_sort)):
+        for xref, with_xref in iter(sorted(_matches(d["items"], d["class"], d["tag"]), key=_sort)):
             status = "passed" if len(with_xref) == 1 else "failed"
             r[status].append({"message": d["msg"][status](len(with_xref), xref), "bullets": map(str, with_xref)})
 
@@ -861,7 +1094,7 @@ def matches(a, key):
         yield key, items, len(items)
 
 
-@story("Anomaly US23")
+@story("Anomaly US23", needs=("names",))
 def unique_name_and_birth_date(gedcom_file):
     """ No more than one individual with the same name and birth date should appear in a GEDCOM file
 
@@ -876,11 +1109,19 @@ def unique_name_and_birth_date(gedcom_file):
     msg = {"passed": "{0} individual found with the name {1} and birth date {2}".format,
            "failed": "{0} individuals found with the name {1} and birth date {2}".format}
     bul = "{0.xref} - Name: {0.name} Birth Date: {0.birth_date}".format
+    individuals = gedcom_file.individuals
+
+    # Only individuals with the same full name can match, so group each name of the name index by birth date
+    groups = {}
+    for name, members in gedcom_file.names.by_full.iteritems():
+        for i in members:
+            if individuals[i].has("birth_date"):
+                groups.setdefault((name, individuals[i].birth_date.val), []).append(individuals[i])
+
+    for key, items in sorted(groups.iteritems()):
+        status = "passed" if len(items) == 1 else "failed"
+        r[status].append({"message": msg[status](len(items), key[0], key[1]), "bullets": map(bul, items)})
 
-    for key, items, count in matches(gedcom_file.individuals, lambda x: (x.name.val.replace("/", ""), x.birth_date.val)):
-        status = "passed" if count == 1 else "failed"
-        r[status].append({"message": msg[status](count, key[0], key[1]), "bullets": map(bul, items)})
-        
     return r
 
 
@@ -1070,24 +1311,60 @@ def include_input_line_numbers():
     pass
 
 
-def include_partial_dates():
-    """ Include partial dates
-    Description: Accept and use dates without days or without days and months
-    story_id: US41
-    author: TBD
-    sprint: TBD
+def date_owner(date):
+    """ Returns the text used for the owner of a date in story messages """
+    if type(date.belongs_to) is gedcom.tag.Individual:
+        return "Individual {0}".format(date.belongs_to)
+    elif type(date.belongs_to) is gedcom.tag.Family:
+        return str(date.belongs_to)
+    return "Gedcom File"
+
+
+@story("Anomaly US41")
+def include_partial_dates(gedcom_file):
+    """ Accept and use dates without days or without days and months
+
+    :sprint: 4
+    :author: Constantine Davantzis
+
+    :param gedcom_file: GEDCOM File to check
+    :type gedcom_file: parser.File
+
     """
-    pass
+    r = {"passed": [], "failed": []}
+    msg = "{0} has a partial {1} date, the first day of the {2} is used".format
+    bul = ["{0} date is {1}".format, "Used as {0}".format]
 
+    for date in gedcom_file.dates:
+        if date.legitimate and date.is_partial:
+            period = "month" if date.precision == gedcom.tools.PRECISION_MONTH else "year"
+            r["passed"].append({"message": msg(date_owner(date), date.type, period),
+                                "bullets": [bul[0](str(date.type).capitalize(), date),
+                                            bul[1](date.dt.strftime("%d %b %Y").upper())]})
+    return r
+
+
+@story("Error US42")
+def reject_illegitimate_dates(gedcom_file):
+    """ All dates should be legitimate dates for the months specified (e.g., 2/30/2015 is not legitimate)
+
+    :sprint: 4
+    :author: Constantine Davantzis
+
+    :param gedcom_file: GEDCOM File to check
+    :type gedcom_file: parser.File
 
-def reject_illegitimate_dates():
-    """ Reject illegitimate dates
-    Description: All dates should be legitimate dates for the months specified (e.g., 2/30/2015 is not legitimate)
-    story_id: US42
-    author: TBD
-    sprint: TBD
     """
-    pass
+    r = {"passed": [], "failed": []}
+    msg = {"passed": "{0} has a legitimate {1} date".format,
+           "failed": "{0} has an illegitimate {1} date".format}
+    bul = "{0} date is {1}".format
+
+    for date in gedcom_file.dates:
+        status = "passed" if date.legitimate else "failed"
+        r[status].append({"message": msg[status](date_owner(date), date.type),
+                          "bullets": [bul(str(date.type).capitalize(), date)]})
+    return r
 
 
 if __name__ == "__main__":
@@ -1138,3 +1415,7 @@ if __name__ == "__main__":
     unique_ids(gedcom_file)
     unique_name_and_birth_date(gedcom_file)
     unique_families_by_spouses(gedcom_file)
+
+    # Dates
+    include_partial_dates(gedcom_file)
+    reject_illegitimate_dates(gedcom_file)